@@ -15,7 +15,67 @@ The script is organized into several parts:
 - Functions for handling PDF files: These functions load a PDF file, extract the text, and normalize it.
 - The main GUI: Creates the GUI where the user can select a PDF file, choose a voice and a model, and generate the speech.
 
-Note: The script uses ffmpeg for combining audio files, pdfreader for reading PDF files, and pdfminer for extracting text from PDFs. It also uses tkinter for the GUI.
+Chunks are synthesized concurrently: up to MAX_CONCURRENT_REQUESTS requests are kept in flight (configurable in the
+config file), every worker backs off together when the API answers with a 429 rate-limit response, and the audio is
+written back in chunk order. Set the ELEVEN_BASE_URL environment variable to point the script at a different TTS
+endpoint, such as the local stub server in PDF2SpeechBenchmark.py.
+
+The text is split into chunks of whole sentences packed up to CHUNK_SIZE characters, which keeps the number of API
+calls low without cutting words in half. Chunk boundaries are also forced after "anchor" sentences picked by a hash of
+their content, so an edit only changes the chunks between its neighbouring anchors and the rest still hit the cache.
+
+With "Stream pages" ticked, opening a PDF doesn't extract anything up front. Instead, when generating, the pages are
+read one at a time through pdfminer's page iterator and normalized, chunked and synthesized as they arrive, so the first
+requests go out within seconds and only a few pages of text are held in memory at once.
+
+Large PDFs are extracted in parallel: the page range is split into batches of EXTRACT_BATCH_PAGES pages that are run
+through pdfminer on a pool of EXTRACT_WORKERS processes and joined back in page order. Files with fewer than
+PARALLEL_EXTRACT_MIN_PAGES pages are extracted serially, where starting the pool would cost more than it saves.
+
+Running headers, footers and page numbers are stripped before chunking. Lines near the top or bottom of a page are
+counted in a frequency index (with digits masked, so "Page 12" and "Page 13" count as the same line, except in headings
+such as "Chapter 12"), and lines found on at least HEADER_FOOTER_MIN_SHARE of the pages read so far, and on at least
+HEADER_FOOTER_MIN_PAGES pages, are removed. It is a single linear pass; in streaming mode it only looks
+HEADER_FOOTER_LOOKAHEAD pages ahead. The characters saved are reported when the PDF has been read. Set
+STRIP_REPEATED_LINES = false in the config file (or pass --keep-headers) to keep them.
+
+Normalization collapses every run of whitespace to a single space in one pass with precompiled patterns, except for
+paragraph breaks (a blank line), which are kept. The chunker treats the end of a paragraph as the end of a sentence,
+and closes a chunk there once it is at least PARAGRAPH_BREAK_FILL full, so the chunks split at natural pauses. The copy
+of the extracted text on the Desktop is written on a background thread, and can be turned off with
+SAVE_EXTRACTED_TEXT = false in the config file.
+
+Synthesized chunks are cached on disk under CACHE_DIR, keyed by a hash of the chunk text, voice, model, stability and
+similarity boost, so re-running an edited document only pays for the chunks that changed. The cache is capped at
+CACHE_MAX_MB and evicts the least recently used chunks first.
+
+Every render keeps a checkpoint manifest under JOBS_DIR, named after the output file, that records each chunk's hash,
+status and where its audio is: the cache entry, or a copy in the job directory if the cache couldn't keep it. If a
+render dies part way, running it again to the same output file reuses every chunk that already succeeded and only
+requests the rest. Chunks that fail with a network or server error are retried up to MAX_CHUNK_RETRIES times with
+exponential backoff, and the job directory is removed once the render has finished.
+
+Each render is timed stage by stage: PDF extraction, header/footer stripping, normalization, chunking, every request to
+the API (latency, characters and bytes), and the MP3 assembly. With WRITE_TRACES on, the timings are written to
+TRACE_DIR as a Chrome trace (open it in chrome://tracing or ui.perfetto.dev). The file also holds a summary with
+characters per second and p50/p95 request latency, and the summary is printed when the render finishes.
+
+The output file is chosen before generation starts, and each chunk's MP3 frames are appended to it as soon as the chunk
+arrives. The ID3 tags and Xing/Info headers of the individual chunks are dropped on the way, so the result is one clean
+stream, without a temporary directory or an ffmpeg process.
+
+Run with a PDF or a directory of PDFs to convert them headless, without Tk:
+
+```bash
+python PDF2Speech.py ~/Scripts --out ~/Renders --voice Rachel --model eleven_multilingual_v1 --jobs 2
+```
+
+Each PDF becomes a job on a queue worked by --jobs threads, and its MP3 is written next to it (or into --out). Files
+that already have an MP3 are skipped unless --overwrite is given. The API key comes from the config file or the
+ELEVEN_API_KEY environment variable. The voice list is only fetched when it is needed and is kept on disk in
+VOICE_CATALOG_FILE for VOICE_CATALOG_TTL seconds, in both the GUI and batch modes.
+
+Note: The script uses pdfreader for reading PDF files, and pdfminer for extracting text from PDFs. It also uses tkinter for the GUI.
 
 To install the necessary libraries, run the following commands:
 
@@ -25,43 +85,137 @@ pip install tkinter
 pip install pdfreader
 pip install pdfminer.six
 pip install elevenlabs
-pip install ffmpeg
 """
 
 import os
 import re
-import subprocess
+import json
+import time
+import zlib
+import hashlib
+import sys
+import queue
+import random
+import argparse
+import threading
 import configparser
-import tkinter as tk
-import tkinter.messagebox as messagebox
-from tkinter import filedialog, simpledialog
-from pdfreader import SimplePDFViewer
+from collections import deque, OrderedDict, Counter
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
 from shutil import rmtree
-from tempfile import mkdtemp
-from pdfminer.high_level import extract_text
-from elevenlabs import set_api_key, voices, generate, Voice, is_voice_id
+from pdfreader import SimplePDFViewer
+from pdfminer.high_level import extract_text, extract_pages
+from pdfminer.layout import LTTextContainer
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import resolve1
+from elevenlabs import set_api_key, voices, generate, Voice, VoiceSettings, is_voice_id
 
 CONFIG_FILE = 'PDF2Speech_config.ini'
 CHUNK_SIZE = 5000
+AVERAGE_SENTENCE_CHARS = 120
+MIN_ANCHOR_SEGMENT = 3  # Chunks of text before a content anchor may close a segment.
+ANCHOR_SPACING = 5  # Chunks of text between content anchors on average, past the minimum.
+PARAGRAPH_BREAK_FILL = 0.75  # How full a chunk must be before a paragraph break may close it.
+STABILITY = 50  # 0-100; the API's own defaults, used when the voice settings aren't changed.
+SIMILARITY_BOOST = 75
+MAX_CONCURRENT_REQUESTS = 4
+MAX_RATE_LIMIT_RETRIES = 6
+RATE_LIMIT_BACKOFF = 1.0  # Seconds; doubled on every consecutive 429 response.
+MAX_CHUNK_RETRIES = 4
+CHUNK_RETRY_BACKOFF = 2.0  # Seconds; doubled on every retry of the same chunk.
+EXTRACT_WORKERS = os.cpu_count() or 1
+EXTRACT_BATCH_PAGES = 16
+PARALLEL_EXTRACT_MIN_PAGES = 48
+STRIP_REPEATED_LINES = True
+HEADER_FOOTER_LINES = 2  # Lines at the top and at the bottom of each page that may be a header or footer.
+HEADER_FOOTER_MIN_PAGES = 4
+HEADER_FOOTER_MIN_SHARE = 0.25  # Share of the pages read so far that a line has to be on to count as a header.
+HEADER_FOOTER_LOOKAHEAD = 8
+SAVE_EXTRACTED_TEXT = True
+EXTRACTED_TEXT_FILE = os.path.expanduser('~/Desktop/extracted_text.txt')
+CACHE_DIR = os.path.expanduser('~/.pdf2speech/cache')
+CACHE_MAX_MB = 2048
+JOBS_DIR = os.path.expanduser('~/.pdf2speech/jobs')
+WRITE_TRACES = True
+TRACE_DIR = os.path.expanduser('~/.pdf2speech/traces')
+VOICE_CATALOG_FILE = os.path.expanduser('~/.pdf2speech/voices.json')
+VOICE_CATALOG_TTL = 24 * 60 * 60
 
 config = configparser.ConfigParser()
 
-if not os.path.exists(CONFIG_FILE):
-    API_KEY = simpledialog.askstring('API Key', 'Enter your ElevenLabs API key:')
-    config['DEFAULT'] = {'API_KEY': API_KEY}
-    with open(CONFIG_FILE, 'w') as configfile:
-        config.write(configfile)
-else:
-    config.read(CONFIG_FILE)
-    API_KEY = config.get('DEFAULT', 'API_KEY')
 
-set_api_key(API_KEY)
+def load_config(ask_for_api_key=None):
+    global API_KEY, MAX_CONCURRENT_REQUESTS, EXTRACT_WORKERS, EXTRACT_BATCH_PAGES, STRIP_REPEATED_LINES
+    global SAVE_EXTRACTED_TEXT, CACHE_DIR, CACHE_MAX_MB, WRITE_TRACES, TRACE_DIR
+    if not os.path.exists(CONFIG_FILE):
+        API_KEY = os.environ.get('ELEVEN_API_KEY')
+        if not API_KEY and ask_for_api_key:
+            API_KEY = ask_for_api_key()
+            config['DEFAULT'] = {'API_KEY': API_KEY}
+            with open(CONFIG_FILE, 'w') as configfile:
+                config.write(configfile)
+        if not API_KEY:
+            raise SystemExit(f"No ElevenLabs API key: set ELEVEN_API_KEY or add API_KEY to {CONFIG_FILE}")
+    else:
+        config.read(CONFIG_FILE)
+        API_KEY = config.get('DEFAULT', 'API_KEY')
+
+    MAX_CONCURRENT_REQUESTS = config.getint('DEFAULT', 'MAX_CONCURRENT_REQUESTS', fallback=MAX_CONCURRENT_REQUESTS)
+    EXTRACT_WORKERS = config.getint('DEFAULT', 'EXTRACT_WORKERS', fallback=EXTRACT_WORKERS)
+    EXTRACT_BATCH_PAGES = config.getint('DEFAULT', 'EXTRACT_BATCH_PAGES', fallback=EXTRACT_BATCH_PAGES)
+    STRIP_REPEATED_LINES = config.getboolean('DEFAULT', 'STRIP_REPEATED_LINES', fallback=STRIP_REPEATED_LINES)
+    SAVE_EXTRACTED_TEXT = config.getboolean('DEFAULT', 'SAVE_EXTRACTED_TEXT', fallback=SAVE_EXTRACTED_TEXT)
+    CACHE_DIR = os.path.expanduser(config.get('DEFAULT', 'CACHE_DIR', fallback=CACHE_DIR))
+    CACHE_MAX_MB = config.getint('DEFAULT', 'CACHE_MAX_MB', fallback=CACHE_MAX_MB)
+    WRITE_TRACES = config.getboolean('DEFAULT', 'WRITE_TRACES', fallback=WRITE_TRACES)
+    TRACE_DIR = os.path.expanduser(config.get('DEFAULT', 'TRACE_DIR', fallback=TRACE_DIR))
+    set_api_key(API_KEY)
+
 
 # Initialization of the text variable
 text = ''
+pdf_path = ''
+load_trace = None
+voice_catalog = None
+
+
+def load_voice_catalog(refresh=False):
+    global voice_catalog
+    if voice_catalog is not None and not refresh:
+        return voice_catalog
+
+    if not refresh:
+        try:
+            if time.time() - os.path.getmtime(VOICE_CATALOG_FILE) < VOICE_CATALOG_TTL:
+                with open(VOICE_CATALOG_FILE) as f:
+                    voice_catalog = json.load(f)
+                return voice_catalog
+        except (OSError, ValueError):
+            pass
+
+    voice_catalog = {voice.name: voice.voice_id for voice in voices()}
+    os.makedirs(os.path.dirname(VOICE_CATALOG_FILE), exist_ok=True)
+    with open(f"{VOICE_CATALOG_FILE}.tmp", 'w') as f:
+        json.dump(voice_catalog, f)
+    os.replace(f"{VOICE_CATALOG_FILE}.tmp", VOICE_CATALOG_FILE)
+    return voice_catalog
+
 
 def fetch_voices():
-    return {voice.name: voice.id for voice in voices()}
+    return load_voice_catalog()
+
+
+def resolve_voice_id(voice_name):
+    if is_voice_id(voice_name):
+        return voice_name
+    # A voice added since the catalog was saved won't be in it yet, so look again before giving up.
+    voice_id = load_voice_catalog().get(voice_name) or load_voice_catalog(refresh=True).get(voice_name)
+    if not voice_id:
+        raise ValueError(f"Voice '{voice_name}' not found.")
+    return voice_id
 
 
 def fetch_models():
@@ -76,73 +230,805 @@ def fetch_models():
         }
     ]
 
-def combine_audio_files(file_paths, output_path):
-    input_files_str = "|".join(file_paths)
-    command = f"ffmpeg -i 'concat:{input_files_str}' -c copy {output_path}"
-    subprocess.call(command, shell=True)
+TRACE_EPOCH = time.perf_counter()
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+class PerformanceTrace:
+    # Timed spans for one render, written out as a Chrome trace with a summary on top. All
+    # traces share one clock, so the spans of two traces (load then generate) can be merged.
+    def __init__(self, name):
+        self.name = name
+        self.events = []
+        self.lock = threading.Lock()
+
+    def add(self, name, start, end, args=None):
+        event = {'name': name, 'ph': 'X', 'ts': (start - TRACE_EPOCH) * 1e6, 'dur': (end - start) * 1e6,
+                 'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args or {}}
+        with self.lock:
+            self.events.append(event)
+
+    @contextmanager
+    def span(self, name, **args):
+        # The args dict is handed to the block, so it can add results such as byte counts.
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.perf_counter(), args)
+
+    def timed(self, name, func, *args):
+        with self.span(name):
+            return func(*args)
+
+    def iter_span(self, name, iterable):
+        # Times each step of an iterator, not the consumer's work in between.
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add(name, start, time.perf_counter())
+            yield item
+
+    def merge(self, other):
+        if other:
+            with self.lock:
+                self.events = other.events + self.events
+
+    def summary(self):
+        with self.lock:
+            events = list(self.events)
+        stages = {}
+        for event in events:
+            stages[event['name']] = stages.get(event['name'], 0) + event['dur'] / 1e6
+        requests = [event for event in events if event['name'] == 'generate']
+        latencies = [event['dur'] / 1e6 for event in requests]
+        characters = sum(event['args'].get('characters', 0) for event in requests)
+        wall = (max(e['ts'] + e['dur'] for e in events) - min(e['ts'] for e in events)) / 1e6 if events else 0
+        synthesis = stages.get('synthesize') or wall
+        return {
+            'name': self.name,
+            'wall_seconds': round(wall, 3),
+            'stage_seconds': {name: round(seconds, 3) for name, seconds in stages.items()},
+            'requests': len(requests),
+            'characters': characters,
+            'audio_bytes': sum(event['args'].get('bytes', 0) for event in requests),
+            'characters_per_second': round(characters / synthesis, 1) if synthesis else None,
+            'latency_p50': percentile(latencies, 50),
+            'latency_p95': percentile(latencies, 95),
+        }
+
+    def report(self):
+        summary = self.summary()
+        stages = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in summary['stage_seconds'].items()
+                           if name not in ('generate', 'synthesize'))
+        latency = ''
+        if summary['requests']:
+            latency = f", p50 {summary['latency_p50']:.2f}s p95 {summary['latency_p95']:.2f}s"
+        return (f"{summary['wall_seconds']:.1f}s wall; {summary['characters']:,} characters in "
+                f"{summary['requests']} requests at {summary['characters_per_second'] or 0:,.0f} chars/s{latency}; "
+                f"{stages}")
+
+    def write(self, path=None):
+        if not path:
+            stem = os.path.splitext(os.path.basename(self.name or 'render'))[0]
+            path = os.path.join(TRACE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{stem}.trace.json")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self.lock:
+            events = list(self.events)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms', 'summary': self.summary()}, f)
+        return path
+
+
+class RateLimitBackoff:
+    # Shared by all synthesis workers. A 429 on any request pauses every worker,
+    # and the pause doubles for as long as the API keeps rate limiting us.
+    def __init__(self, base_delay=None, max_delay=60.0):
+        self.base_delay = base_delay or RATE_LIMIT_BACKOFF
+        self.max_delay = max_delay
+        self.delay = self.base_delay
+        self.resume_at = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        while True:
+            with self.lock:
+                remaining = self.resume_at - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def penalize(self):
+        with self.lock:
+            now = time.monotonic()
+            # Workers that were already in flight when the pause started don't extend it again.
+            if now < self.resume_at:
+                return
+            self.resume_at = now + self.delay + random.uniform(0, self.delay / 4)
+            self.delay = min(self.delay * 2, self.max_delay)
+
+    def relax(self):
+        with self.lock:
+            self.delay = self.base_delay
+
+    def wrap(self, synthesize):
+        # Only the request itself is retried; a failure writing the cache or the checkpoint isn't a network error.
+        return lambda chunk: synthesize_with_backoff(synthesize, chunk, self)
+
+
+def error_status(error):
+    # elevenlabs' APIError keeps the status as a string in 'status', which is either the HTTP status or an error code
+    # such as 'too_many_concurrent_requests'; requests' errors carry it on their response.
+    status = getattr(error, 'status_code', None) or getattr(getattr(error, 'response', None), 'status_code', None)
+    if status is None:
+        status = getattr(error, 'status', None)
+    return int(status) if isinstance(status, str) and status.isdigit() else status
+
+
+def is_rate_limited(error):
+    if error_status(error) == 429:
+        return True
+    message = f"{error} {error_status(error) or ''}".lower()
+    return '429' in message or 'rate limit' in message or 'too_many' in message or 'too many' in message
+
+
+def is_transient(error):
+    # Dropped connections and timeouts (requests' errors are OSErrors) and 5xx responses are worth another try. A 5xx
+    # without a JSON body, e.g. from a proxy, makes elevenlabs fail parsing the error, so that counts as one too.
+    status = error_status(error)
+    return (isinstance(error, (OSError, json.JSONDecodeError))
+            or (isinstance(status, int) and status >= 500))
+
+
+def synthesize_with_backoff(synthesize, chunk, backoff):
+    rate_limits = 0
+    failures = 0
+    while True:
+        backoff.wait()
+        try:
+            audio = synthesize(chunk)
+        except Exception as e:
+            if is_rate_limited(e) and rate_limits < MAX_RATE_LIMIT_RETRIES:
+                rate_limits += 1
+                backoff.penalize()
+            elif is_transient(e) and failures < MAX_CHUNK_RETRIES:
+                # Unlike a 429, a failed request only holds up its own chunk.
+                time.sleep(CHUNK_RETRY_BACKOFF * 2 ** failures)
+                failures += 1
+            else:
+                raise
+        else:
+            backoff.relax()
+            return audio
+
+
+def synthesize_chunks(chunks, synthesize, max_workers=None):
+    # Keeps up to max_workers requests in flight and yields the audio in chunk order,
+    # so callers can write it out exactly as if it had been generated serially.
+    max_workers = max_workers or MAX_CONCURRENT_REQUESTS
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(synthesize, chunk))
+            # Don't run too far ahead of the chunk we are waiting on.
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class SynthesisCache:
+    # Content-addressed store of synthesized chunks. Each file is named after the hash of
+    # everything that affects its audio, and the entries are kept in least recently used order.
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or CACHE_DIR
+        self.max_bytes = max_bytes or CACHE_MAX_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+        # File mtimes are bumped on every hit, so they give us the LRU order across runs.
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.mp3'):
+                st = os.stat(os.path.join(self.directory, name))
+                files.append((st.st_mtime, name[:-4], st.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def key(text, voice_id, model_id, stability, similarity_boost):
+        payload = json.dumps([text, voice_id, model_id, stability, similarity_boost])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def has(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        try:
+            with open(self.path(key), 'rb') as f:
+                audio = f.read()
+            os.utime(self.path(key))
+        except OSError:
+            # Removed behind our back; treat it as a miss.
+            with self.lock:
+                self.total_bytes -= self.entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return audio
+
+    def put(self, key, audio):
+        # Write next to the final name and rename, so concurrent workers never see a partial file.
+        tmp_path = f"{self.path(key)}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(audio)
+            os.replace(tmp_path, self.path(key))
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self.lock:
+            self.total_bytes += len(audio) - self.entries.pop(key, 0)
+            self.entries[key] = len(audio)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    os.remove(self.path(old_key))
+                except OSError:
+                    pass
+
+    def wrap(self, synthesize, voice_id, model_id, stability, similarity_boost):
+        def cached_synthesize(chunk):
+            key = self.key(chunk, voice_id, model_id, stability, similarity_boost)
+            audio = self.get(key)
+            if audio is None:
+                audio = synthesize(chunk)
+                try:
+                    self.put(key, audio)
+                except OSError:
+                    pass  # A full or read-only cache only costs us the reuse; the job checkpoint keeps its own copy.
+            return audio
+        return cached_synthesize
+
+
+# A sentence ends at terminal punctuation followed by whitespace, or at a paragraph break.
+SENTENCE_PATTERN = re.compile(r'\S.*?(?:[.!?]["\')\]]*\s+|\n\n|$)', re.S)
+
+
+def split_sentences(text):
+    return SENTENCE_PATTERN.findall(text)
+
+
+def split_long_sentence(sentence, budget):
+    # Sentences over budget are cut at the last space that fits, or mid-word as a last resort.
+    while len(sentence) > budget:
+        cut = sentence.rfind(' ', 0, budget) + 1 or budget
+        yield sentence[:cut]
+        sentence = sentence[cut:]
+    if sentence:
+        yield sentence
+
+
+def pack_sentences(sentences, budget=None):
+    budget = budget or CHUNK_SIZE
+    modulus = max(1, budget * ANCHOR_SPACING // AVERAGE_SENTENCE_CHARS)
+    chunk = []
+    chunk_len = 0
+    segment_len = 0
+    for sentence in sentences:
+        for piece in split_long_sentence(sentence, budget):
+            if chunk and chunk_len + len(piece) > budget:
+                yield ''.join(chunk).strip()
+                chunk = []
+                chunk_len = 0
+            chunk.append(piece)
+            chunk_len += len(piece)
+            segment_len += len(piece)
+
+        # Close the chunk on a content anchor, so the boundaries after it don't depend on anything before it.
+        if segment_len >= budget * MIN_ANCHOR_SEGMENT and zlib.crc32(sentence.strip().encode('utf-8')) % modulus == 0:
+            yield ''.join(chunk).strip()
+            chunk = []
+            chunk_len = 0
+            segment_len = 0
+        # A chunk that is nearly full is better ended on a paragraph than half way through the next one.
+        elif sentence.endswith('\n\n') and chunk_len >= budget * PARAGRAPH_BREAK_FILL:
+            yield ''.join(chunk).strip()
+            chunk = []
+            chunk_len = 0
+    if chunk:
+        yield ''.join(chunk).strip()
+
+
+def chunk_text(text, budget=None):
+    return [chunk for chunk in pack_sentences(split_sentences(text), budget) if chunk]
+
+
+PARAGRAPH_BREAK = re.compile(r'\n[^\S\n]*\n\s*')
+
+
+def normalize_text(text):
+    # Split on blank lines to keep the paragraphs, then collapse every other run of whitespace
+    # inside each paragraph with str.split(), which is much quicker than a regex substitution.
+    paragraphs = (' '.join(paragraph.split()) for paragraph in PARAGRAPH_BREAK.split(text))
+    return '\n\n'.join(paragraph for paragraph in paragraphs if paragraph)
+
+
+def normalize_pages(pages):
+    for page in pages:
+        yield normalize_text(page)
+
+
+class ExtractedTextWriter:
+    # Saves a copy of the extracted text on a background thread, so the pipeline never waits on the disk.
+    def __init__(self, path=None):
+        self.path = path or EXTRACTED_TEXT_FILE
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        try:
+            with open(self.path, 'w') as f:
+                for text in iter(self.queue.get, None):
+                    f.write(text)
+        except OSError as e:
+            print(f"Couldn't save the extracted text to {self.path}: {e}")
+
+    def write(self, text):
+        self.queue.put(text)
+
+    def close(self):
+        self.queue.put(None)
+
+
+def tee_pages(pages, writer):
+    try:
+        for page in pages:
+            writer.write(page + '\n\n')
+            yield page
+    finally:
+        writer.close()
+
+
+def count_pdf_pages(pdf_path):
+    with open(pdf_path, 'rb') as fp:
+        document = PDFDocument(PDFParser(fp))
+        pages = resolve1(document.catalog.get('Pages'))
+        if pages and 'Count' in pages:
+            return resolve1(pages['Count'])
+        return sum(1 for _ in PDFPage.create_pages(document))
+
+
+def extract_page_batch(pdf_path, page_numbers):
+    return extract_text(pdf_path, page_numbers=page_numbers)
+
+
+def extract_text_parallel(pdf_path, workers=None, batch_pages=None):
+    workers = workers or EXTRACT_WORKERS
+    batch_pages = batch_pages or EXTRACT_BATCH_PAGES
+    page_count = count_pdf_pages(pdf_path)
+    if workers < 2 or page_count < PARALLEL_EXTRACT_MIN_PAGES:
+        return extract_text(pdf_path)
+
+    # pdfminer's layout analysis is pure Python, so each batch of pages goes to its own process.
+    # map() hands the results back in submission order, which keeps the pages in order.
+    batches = [range(start, min(start + batch_pages, page_count)) for start in range(0, page_count, batch_pages)]
+    with ProcessPoolExecutor(max_workers=min(workers, len(batches))) as pool:
+        return ''.join(pool.map(extract_page_batch, repeat(pdf_path), batches))
+
+
+def iter_pdf_pages(pdf_path):
+    # Each text box ends with a blank line, as in extract_text, so paragraph breaks survive page-by-page reading.
+    for page_layout in extract_pages(pdf_path):
+        yield ''.join(element.get_text() + '\n' for element in page_layout if isinstance(element, LTTextContainer))
+
+
+def iter_sentences(pages, budget=None):
+    budget = budget or CHUNK_SIZE
+    carry = ''
+    for page in pages:
+        sentences = split_sentences(carry + page)
+        # The last sentence may carry on over the page break, unless it has already grown past a whole chunk.
+        carry = sentences.pop() if sentences else ''
+        if len(carry) > budget:
+            sentences.append(carry)
+            carry = ''
+        yield from sentences
+    if carry:
+        yield carry
+
+
+class RepeatedLineFilter:
+    # Frequency index of the lines at the edges of each page. Lines that come back on page after
+    # page are running headers, footers or page numbers, and are stripped before chunking.
+    DIGITS = re.compile(r'\d+')
+    SPACES = re.compile(r'\s+')
+    # Numbered headings keep their numbers, or every chapter's first line would count as the same line.
+    HEADING = re.compile(r'(chapter|section|part|appendix|lesson|unit|volume|book|act|scene) [\d.]+')
+
+    def __init__(self, edge_lines=None, min_pages=None, min_share=None):
+        self.edge_lines = edge_lines or HEADER_FOOTER_LINES
+        self.min_pages = min_pages or HEADER_FOOTER_MIN_PAGES
+        self.min_share = min_share or HEADER_FOOTER_MIN_SHARE
+        self.counts = Counter()
+        self.pages = 0
+        self.lines_removed = 0
+        self.chars_removed = 0
+        self.removed = set()
+
+    def line_key(self, line):
+        line = self.SPACES.sub(' ', line).strip().lower()
+        return line if self.HEADING.fullmatch(line) else self.DIGITS.sub('#', line)
+
+    def threshold(self):
+        # A line has to repeat on a share of the pages, so a short document's few repeats aren't taken for headers.
+        return max(self.min_pages, int(self.min_share * self.pages + 0.999))
+
+    def edges(self, lines):
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        return set(content[:self.edge_lines] + content[-self.edge_lines:])
+
+    def learn(self, page):
+        lines = page.split('\n')
+        self.counts.update({self.line_key(lines[i]) for i in self.edges(lines)})
+        self.pages += 1
+
+    def strip(self, page):
+        lines = page.split('\n')
+        threshold = self.threshold()
+        drop = {i for i in self.edges(lines) if self.counts[self.line_key(lines[i])] >= threshold}
+        for i in drop:
+            self.lines_removed += 1
+            self.chars_removed += len(lines[i])
+            self.removed.add(self.line_key(lines[i]))
+        return '\n'.join(line for i, line in enumerate(lines) if i not in drop)
+
+    def filter_pages(self, pages, lookahead=None):
+        # Every page is counted before it is stripped. With a lookahead only that many pages are held
+        # back to count ahead; without one, the whole document is counted first.
+        held = deque()
+        for page in pages:
+            self.learn(page)
+            held.append(page)
+            if lookahead is not None and len(held) > lookahead:
+                yield self.strip(held.popleft())
+        while held:
+            yield self.strip(held.popleft())
+
+    def report(self):
+        return (f"Removed {self.lines_removed} repeated header/footer lines ({len(self.removed)} distinct), "
+                f"saving {self.chars_removed:,} characters")
+
+
+def extract_clean_text(pdf_path, line_filter=None, trace=None):
+    trace = trace or PerformanceTrace(pdf_path)
+    # extract_text separates the pages with form feeds.
+    with trace.span('extract', workers=EXTRACT_WORKERS) as args:
+        pages = extract_text_parallel(pdf_path).split('\f')
+        args['pages'] = len(pages)
+    if line_filter:
+        with trace.span('strip headers'):
+            pages = list(line_filter.filter_pages(pages))
+    # A page break is not a paragraph break; most of the time it falls in the middle of one.
+    with trace.span('normalize'):
+        return normalize_text('\n'.join(page.rstrip() for page in pages))
+
+
+def stream_chunks(pdf_path, budget=None, line_filter=None, text_writer=None, trace=None):
+    trace = trace or PerformanceTrace(pdf_path)
+    pages = trace.iter_span('extract page', iter_pdf_pages(pdf_path))
+    if line_filter:
+        pages = line_filter.filter_pages(pages, lookahead=HEADER_FOOTER_LOOKAHEAD)
+    pages = (trace.timed('normalize', normalize_text, page) for page in pages)
+    if text_writer:
+        pages = tee_pages(pages, text_writer)
+    pages = (page + ' ' for page in pages)
+    return (chunk for chunk in pack_sentences(iter_sentences(pages, budget), budget) if chunk)
+
+
+class SynthesisJob:
+    # Checkpoint manifest for one render, so a render that dies part way can pick up where it left off. Chunks are
+    # recorded under their cache key and point at the cache entry; the audio is only copied into the job directory
+    # when the cache couldn't keep it. Cache hits aren't recorded at all, since the cache will have them next time too.
+    def __init__(self, name, cache):
+        self.cache = cache
+        job_id = hashlib.sha256(os.path.abspath(name).encode('utf-8')).hexdigest()[:16]
+        self.directory = os.path.join(JOBS_DIR, job_id)
+        self.manifest_path = os.path.join(self.directory, 'manifest.json')
+        self.resumed = 0
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {'name': name, 'chunks': {}}
+
+    def save(self):
+        # Called with the lock held.
+        with open(f"{self.manifest_path}.tmp", 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(f"{self.manifest_path}.tmp", self.manifest_path)
+
+    def load_chunk(self, key):
+        with self.lock:
+            entry = self.manifest['chunks'].get(key)
+            if not entry or entry['status'] != 'done':
+                return None
+        try:
+            with open(entry['file'], 'rb') as f:
+                audio = f.read()
+        except OSError:
+            return None
+        with self.lock:
+            self.resumed += 1
+        return audio
+
+    def record(self, key, index, status, audio=None, error=None):
+        with self.lock:
+            entry = self.manifest['chunks'].get(key)
+            if entry and entry['status'] == 'done':
+                return  # The same text again; it is checkpointed already.
+        entry_file = None
+        if audio is not None:
+            entry_file = self.cache.path(key)
+            if not self.cache.has(key):
+                entry_file = os.path.join(self.directory, f"{key}.mp3")
+                with open(entry_file, 'wb') as f:
+                    f.write(audio)
+        with self.lock:
+            entry = self.manifest['chunks'].setdefault(key, {'attempts': 0})
+            entry.update(index=index, status=status, attempts=entry['attempts'] + 1)
+            if entry_file:
+                entry['file'] = entry_file
+            if error:
+                entry['error'] = error
+            else:
+                entry.pop('error', None)
+            self.save()
+
+    def wrap(self, synthesize, key_for):
+        # The wrapped function takes (index, chunk) pairs and records every attempt in the manifest.
+        def checkpointed(item):
+            index, chunk = item
+            key = key_for(chunk)
+            audio = self.load_chunk(key)
+            if audio is not None:
+                return audio
+            if self.cache.has(key):
+                return synthesize(chunk)
+            try:
+                audio = synthesize(chunk)
+            except Exception as e:
+                self.record(key, index, 'failed', error=str(e))
+                raise
+            self.record(key, index, 'done', audio=audio)
+            return audio
+        return checkpointed
+
+    def finish(self):
+        rmtree(self.directory, ignore_errors=True)
+
+
+MPEG1_LAYER3_BITRATES = [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320]
+MPEG2_LAYER3_BITRATES = [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+MPEG_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def id3v2_size(audio):
+    if len(audio) < 10 or audio[:3] != b'ID3':
+        return 0
+    # The tag size is stored as a 28-bit "synchsafe" integer, plus 10 bytes of footer if the flag is set.
+    size = (audio[6] & 0x7f) << 21 | (audio[7] & 0x7f) << 14 | (audio[8] & 0x7f) << 7 | (audio[9] & 0x7f)
+    return 10 + size + (10 if audio[5] & 0x10 else 0)
+
+
+def mp3_frame_length(header):
+    if len(header) < 4 or header[0] != 0xff or header[1] & 0xe0 != 0xe0:
+        return 0
+    version = (header[1] >> 3) & 3
+    layer = (header[1] >> 1) & 3
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 3
+    padding = (header[2] >> 1) & 1
+    # Only MPEG Layer III is handled, which is all the API returns.
+    if version == 1 or layer != 1 or bitrate_index in (0, 15) or rate_index == 3:
+        return 0
+    if version == 3:
+        return 144 * MPEG1_LAYER3_BITRATES[bitrate_index] * 1000 // MPEG_SAMPLE_RATES[version][rate_index] + padding
+    return 72 * MPEG2_LAYER3_BITRATES[bitrate_index] * 1000 // MPEG_SAMPLE_RATES[version][rate_index] + padding
+
+
+def strip_mp3_headers(audio, keep_id3=False):
+    # Returns the parts of one chunk's MP3 worth appending to the combined file: its frames without
+    # the trailing ID3v1 tag or the Xing/Info/VBRI frame that describes only this chunk's length.
+    start = id3v2_size(audio)
+    end = len(audio) - 128 if len(audio) >= 128 and audio[-128:-125] == b'TAG' else len(audio)
+    parts = [memoryview(audio)[:start]] if keep_id3 and start else []
+
+    frame_length = mp3_frame_length(audio[start:start + 4])
+    if frame_length:
+        frame = audio[start:start + frame_length]
+        if b'Xing' in frame[4:64] or b'Info' in frame[4:64] or frame[36:40] == b'VBRI':
+            start += frame_length
+    parts.append(memoryview(audio)[start:end])
+    return parts
+
+
+class MP3Assembler:
+    # Appends each chunk's MP3 frames to the output file as soon as the chunk arrives, so
+    # nothing but the chunk being written is ever held in memory.
+    def __init__(self, output_path):
+        self.file = open(output_path, 'wb')
+        self.chunks = 0
+        self.bytes_written = 0
+
+    def append(self, audio):
+        # Only the first chunk's ID3 tag is kept; the rest would show up as garbage mid-stream.
+        for part in strip_mp3_headers(audio, keep_id3=self.chunks == 0):
+            self.file.write(part)
+            self.bytes_written += len(part)
+        self.chunks += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def combine_audio_files(file_paths, output_path, trace=None):
+    trace = trace or PerformanceTrace(output_path)
+    with trace.span('combine', files=len(file_paths)) as args, MP3Assembler(output_path) as assembler:
+        for file_path in file_paths:
+            with open(file_path, 'rb') as f:
+                assembler.append(f.read())
+        args['bytes'] = assembler.bytes_written
+
+def synthesize_to_file(chunks, output_path, voice_id, model, stability, similarity_boost, on_progress=None,
+                       job_name=None, trace=None):
+    trace = trace or PerformanceTrace(output_path)
+    voice = Voice(voice_id=voice_id, settings=VoiceSettings(stability=stability, similarity_boost=similarity_boost))
+    cache = SynthesisCache()
+    job = SynthesisJob(job_name or output_path, cache)
+
+    def request(chunk):
+        with trace.span('generate', characters=len(chunk)) as args:
+            audio = generate(chunk, voice=voice, model=model)
+            args['bytes'] = len(audio)
+        return audio
+
+    synthesize = RateLimitBackoff().wrap(request)
+    synthesize = cache.wrap(synthesize, voice_id, model, stability, similarity_boost)
+    synthesize = job.wrap(synthesize, lambda chunk: cache.key(chunk, voice_id, model, stability, similarity_boost))
+
+    # Generate the audio for the chunks concurrently; it comes back in chunk order.
+    with trace.span('synthesize') as args, MP3Assembler(output_path) as assembler:
+        for i, audio in enumerate(synthesize_chunks(enumerate(chunks), synthesize)):
+            # Append the audio to the combined file.
+            trace.timed('assemble', assembler.append, audio)
+            if on_progress:
+                on_progress(i + 1)
+        args.update(chunks=assembler.chunks, bytes=assembler.bytes_written, resumed=job.resumed,
+                    cached=cache.hits)
+
+    # Everything made it into the output file, so the checkpoints aren't needed any more.
+    job.finish()
+    return cache, job
+
 
 def generate_audio():
     # Use the global text variable
     global text
-    selected_voice_name = voice_var.get()
     selected_model = model_var.get()
+    stability = stability_scale.get() / 100
+    similarity_boost = similarity_scale.get() / 100
+    voice_id = resolve_voice_id(voice_var.get())
 
-    # Check if selected voice is voice_id or voice name
-    voice = selected_voice_name if is_voice_id(selected_voice_name) else next((v for v in voices() if v.name == selected_voice_name), None)
-    if not voice:
-        raise ValueError(f"Voice '{selected_voice_name}' not found.")
-
-    # Split the text into chunks.
-    chunks = [text[i: i + CHUNK_SIZE] for i in range(0, len(text), CHUNK_SIZE)]
-    
-    # Create a temporary directory for storing chunks
-    tmp_dir = mkdtemp()
-    file_paths = []
-    total_chunks = len(chunks)
-    for i, chunk in enumerate(chunks):
-        # Update the status text with the progress percentage.
-        progress = round((i / total_chunks) * 100, 2)
-        status_label.config(text=f"Processing voice for chunk {i+1} of {total_chunks} - {progress}% complete")
+    # Ask where to save up front, so each chunk can go straight into the combined file.
+    combined_file_path = filedialog.asksaveasfilename(defaultextension=".mp3", filetypes=[("MP3 Files", "*.mp3")])
+    if not combined_file_path:  # The user cancelled the dialog
+        return
 
-        # Generate the audio for this chunk of text.
-        audio = generate(chunk, voice=voice, model=selected_model)
+    # Split the text into chunks, or read them from the PDF page by page as they are needed.
+    global load_trace
+    trace = PerformanceTrace(pdf_path)
+    line_filter = None
+    if stream_var.get():
+        line_filter = RepeatedLineFilter() if STRIP_REPEATED_LINES else None
+        text_writer = ExtractedTextWriter() if SAVE_EXTRACTED_TEXT else None
+        chunks = stream_chunks(pdf_path, line_filter=line_filter, text_writer=text_writer, trace=trace)
+        total_chunks = None
+    else:
+        # Include the extraction from load_pdf in this render's trace.
+        trace.merge(load_trace)
+        load_trace = None
+        chunks = trace.timed('chunk', chunk_text, text)
+        total_chunks = len(chunks)
 
-        # Save the audio to a temporary file.
-        file_path = f"{tmp_dir}/chunk_{i+1}.mp3"
-        with open(file_path, 'wb') as f:
-            f.write(audio)
-        file_paths.append(file_path)
-
-    # Combine all audio files into one.
-    combined_file_path = filedialog.asksaveasfilename(defaultextension=".mp3", filetypes=[("MP3 Files", "*.mp3")])
-    if combined_file_path: # If a file path is provided (i.e., the user didn't cancel the dialog)
-        combine_audio_files(file_paths, combined_file_path)
+    def show_progress(done):
+        # Update the status text with the progress percentage.
+        if total_chunks:
+            progress = round((done / total_chunks) * 100, 2)
+            status_label.config(text=f"Received voice for chunk {done} of {total_chunks} - {progress}% complete")
+        else:
+            status_label.config(text=f"Received voice for chunk {done}")
+        root.update_idletasks()
 
-    # Delete the temporary directory and its contents.
-    rmtree(tmp_dir)
+    # Render to a .part file, as the batch mode does, so a failed render never overwrites a finished file.
+    partial_path = f"{combined_file_path}.part"
+    cache, job = synthesize_to_file(chunks, partial_path, voice_id, selected_model, stability, similarity_boost,
+                                    on_progress=show_progress, job_name=combined_file_path, trace=trace)
+    os.replace(partial_path, combined_file_path)
 
     # Update the status text.
-    status_label.config(text=f"Finished generating voice")
+    status_label.config(text=f"Finished generating voice ({job.resumed} resumed, {cache.hits} cached, "
+                             f"{cache.misses} generated)")
+    if line_filter:
+        print(line_filter.report())
+    print(trace.report())
+    if WRITE_TRACES:
+        print(f"Trace written to {trace.write()}")
 
 
 def load_pdf():
-    global text
+    global text, pdf_path, load_trace
     pdf_path = filedialog.askopenfilename()
-    text = extract_text(pdf_path)
 
-    # Normalize whitespace
-    text = re.sub(r'\s+', ' ', text)
+    # In streaming mode the pages are only read once generation starts.
+    if stream_var.get():
+        text = ''
+        status_text.set("PDF selected - pages will be read while generating")
+        return
 
-    # Replace any occurrence of more than one space with a single space.
-    text = re.sub(r" +", " ", text)
+    line_filter = RepeatedLineFilter() if STRIP_REPEATED_LINES else None
+    load_trace = PerformanceTrace(pdf_path)
+    text = extract_clean_text(pdf_path, line_filter, trace=load_trace)
+    if line_filter:
+        print(line_filter.report())
 
-    # Replace any occurrence of more than one newline with a single newline.
-    text = re.sub(r"\n+", "\n", text)
+    # Save the extracted text to a .txt file on the desktop, without waiting for it.
+    if SAVE_EXTRACTED_TEXT:
+        text_writer = ExtractedTextWriter()
+        text_writer.write(text)
+        text_writer.close()
 
-    # Save the extracted text to a .txt file on the desktop.
-    with open(os.path.expanduser("~/Desktop/extracted_text.txt"), "w") as f:
-        f.write(text)
-    
     # Set a status message instead of changing the button text.
     status_text.set("Finished loading PDF")
 
@@ -154,38 +1040,145 @@ def save(audio):
             f.write(audio)
 
 
-root = tk.Tk()
-root.geometry('250x625')
-root.configure(bg='#da3467')
+def find_pdfs(input_path):
+    if os.path.isfile(input_path):
+        return [input_path]
+    return sorted(os.path.join(input_path, name) for name in os.listdir(input_path) if name.lower().endswith('.pdf'))
+
+
+def convert_pdf(pdf_path, output_path, voice_id, args):
+    trace = PerformanceTrace(pdf_path)
+    line_filter = RepeatedLineFilter() if STRIP_REPEATED_LINES and not args.keep_headers else None
+    if args.stream:
+        chunks = stream_chunks(pdf_path, line_filter=line_filter, trace=trace)
+    else:
+        text = extract_clean_text(pdf_path, line_filter, trace=trace)
+        chunks = trace.timed('chunk', chunk_text, text)
+
+    # Render to a .part file so an interrupted job is never mistaken for a finished one.
+    partial_path = f"{output_path}.part"
+    cache, job = synthesize_to_file(chunks, partial_path, voice_id, args.model, args.stability / 100,
+                                    args.similarity_boost / 100, job_name=output_path, trace=trace)
+    os.replace(partial_path, output_path)
+    if line_filter:
+        print(f"{pdf_path}: {line_filter.report()}")
+    print(f"{pdf_path}: {trace.report()}")
+    if WRITE_TRACES:
+        trace.write(os.path.join(args.trace_dir, f"{os.path.basename(output_path)}.trace.json")
+                    if args.trace_dir else None)
+    return cache, job
+
+
+def run_batch(args):
+    voice_id = resolve_voice_id(args.voice)
+    jobs = queue.Queue()
+    for pdf_path in find_pdfs(args.input):
+        jobs.put(pdf_path)
+    print(f"Converting {jobs.qsize()} PDFs with {args.jobs} job(s)")
+    failures = []
+
+    def work():
+        while True:
+            try:
+                pdf_path = jobs.get_nowait()
+            except queue.Empty:
+                return
+            output_dir = args.out or os.path.dirname(pdf_path)
+            output_path = os.path.join(output_dir, os.path.splitext(os.path.basename(pdf_path))[0] + '.mp3')
+            if os.path.exists(output_path) and not args.overwrite:
+                print(f"Skipping {pdf_path}: {output_path} already exists")
+                continue
+
+            start = time.perf_counter()
+            try:
+                cache, job = convert_pdf(pdf_path, output_path, voice_id, args)
+            except Exception as e:
+                print(f"Failed to convert {pdf_path}: {e}")
+                failures.append(pdf_path)
+            else:
+                print(f"Converted {pdf_path} -> {output_path} in {time.perf_counter() - start:.1f}s "
+                      f"({job.resumed} resumed, {cache.hits} cached, {cache.misses} generated)")
+
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+    workers = [threading.Thread(target=work) for _ in range(max(1, args.jobs))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return 1 if failures else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Convert PDFs to speech with ElevenLabs. '
+                                                 'Run without arguments to open the GUI.')
+    parser.add_argument('input', nargs='?', help='A PDF or a directory of PDFs to convert headless')
+    parser.add_argument('--out', help='Directory for the MP3s (defaults to next to each PDF)')
+    parser.add_argument('--voice', help='Voice name or voice id')
+    parser.add_argument('--model', default=fetch_models()[0]['model_id'],
+                        choices=[model['model_id'] for model in fetch_models()])
+    parser.add_argument('--stability', type=int, default=STABILITY, help='0-100')
+    parser.add_argument('--similarity-boost', type=int, default=SIMILARITY_BOOST, help='0-100')
+    parser.add_argument('--jobs', type=int, default=1, help='PDFs to convert at the same time')
+    parser.add_argument('--stream', action='store_true', help='Read and synthesize the pages as they are extracted')
+    parser.add_argument('--keep-headers', action='store_true', help="Don't strip repeated headers and footers")
+    parser.add_argument('--trace-dir', help='Directory for the per-PDF trace files (defaults to TRACE_DIR)')
+    parser.add_argument('--overwrite', action='store_true', help='Convert PDFs that already have an MP3')
+    args = parser.parse_args(argv)
+    if args.input and not args.voice:
+        parser.error('--voice is required when converting headless')
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.input:
+        load_config()
+        sys.exit(run_batch(args))
+
+    # Tk is only needed, and only imported, for the GUI.
+    import tkinter as tk
+    from tkinter import filedialog, simpledialog
+    load_config(lambda: simpledialog.askstring('API Key', 'Enter your ElevenLabs API key:'))
+
+    root = tk.Tk()
+    root.geometry('250x625')
+    root.configure(bg='#da3467')
+
+    open_file_btn = tk.Button(root, text="Open PDF", command=load_pdf, bg='#ffa49a', fg='#35333f')
+    open_file_btn.pack(pady=10)
 
-open_file_btn = tk.Button(root, text="Open PDF", command=load_pdf, bg='#ffa49a', fg='#35333f')
-open_file_btn.pack(pady=10)
+    tk.Label(root, text='Select Voice', bg='#ffa49a', fg='black').pack()
+    voice_var = tk.StringVar(root)
+    voice_options = list(fetch_voices())
+    voice_dropdown = tk.OptionMenu(root, voice_var, *voice_options)
+    voice_dropdown.pack(pady=10)
 
-tk.Label(root, text='Select Voice', bg='#ffa49a', fg='black').pack()
-voice_var = tk.StringVar(root)
-voice_options = [voice.name for voice in voices()]
-voice_dropdown = tk.OptionMenu(root, voice_var, *voice_options)
-voice_dropdown.pack(pady=10)
+    tk.Label(root, text='Select Model', bg='#ffa49a', fg='black').pack()
+    model_var = tk.StringVar(root)
+    model_options = [model["model_id"] for model in fetch_models()]
+    model_dropdown = tk.OptionMenu(root, model_var, *model_options)
+    model_dropdown.pack(pady=10)
 
-tk.Label(root, text='Select Model', bg='#ffa49a', fg='black').pack()
-model_var = tk.StringVar(root)
-model_options = [model["model_id"] for model in fetch_models()]
-model_dropdown = tk.OptionMenu(root, model_var, *model_options)
-model_dropdown.pack(pady=10)
+    tk.Label(root, text='Stability', bg='#ffa49a', fg='black').pack()
+    stability_scale = tk.Scale(root, from_=0, to=100, orient="horizontal", bg='#ffa49a', troughcolor='#35333f')  
+    stability_scale.set(STABILITY)
+    stability_scale.pack(pady=10)
 
-tk.Label(root, text='Stability', bg='#ffa49a', fg='black').pack()
-stability_scale = tk.Scale(root, from_=0, to=100, orient="horizontal", bg='#ffa49a', troughcolor='#35333f')  
-stability_scale.pack(pady=10)
+    tk.Label(root, text='Similarity Boost', bg='#ffa49a', fg='black').pack()
+    similarity_scale = tk.Scale(root, from_=0, to=100, orient="horizontal", bg='#ffa49a', troughcolor='#35333f')  
+    similarity_scale.set(SIMILARITY_BOOST)
+    similarity_scale.pack(pady=10)
 
-tk.Label(root, text='Similarity Boost', bg='#ffa49a', fg='black').pack()
-similarity_scale = tk.Scale(root, from_=0, to=100, orient="horizontal", bg='#ffa49a', troughcolor='#35333f')  
-similarity_scale.pack(pady=10)
+    stream_var = tk.BooleanVar(root, value=False)
+    stream_check = tk.Checkbutton(root, text='Stream pages', variable=stream_var, bg='#ffa49a', fg='black')
+    stream_check.pack(pady=10)
 
-generate_btn = tk.Button(root, text="Generate Audio", command=generate_audio, bg='#ffa49a', fg='#35333f')
-generate_btn.pack(pady=10)
+    generate_btn = tk.Button(root, text="Generate Audio", command=generate_audio, bg='#ffa49a', fg='#35333f')
+    generate_btn.pack(pady=10)
 
-status_text = tk.StringVar(root, value="Ready")
-status_label = tk.Label(root, textvariable=status_text, bg='#ffa49a', fg='black')
-status_label.pack(pady=10)
+    status_text = tk.StringVar(root, value="Ready")
+    status_label = tk.Label(root, textvariable=status_text, bg='#ffa49a', fg='black')
+    status_label.pack(pady=10)
 
-root.mainloop()
+    root.mainloop()
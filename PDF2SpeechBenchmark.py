@@ -0,0 +1,501 @@
+"""
+Title: PDF2Speech Benchmark
+Samuel Justice
+
+Description:
+
+Benchmarks for PDF2Speech.py that run entirely offline. A small stub of the ElevenLabs text-to-speech endpoint is
+started on localhost and the ELEVEN_BASE_URL environment variable is pointed at it before PDF2Speech (and with it the
+elevenlabs library) is imported, so the real `generate` calls go over HTTP without touching the real API or spending
+quota.
+
+The stub adds an artificial latency to every request and answers with a 429 rate-limit response whenever more than
+--server-limit requests are in flight, the same way ElevenLabs rejects too many concurrent requests. It can also
+answer a share of the requests with a bare 500 error without a JSON body (--error-rate), which the elevenlabs library
+fails to parse, and cap the requests per second (--rate-limit). In the synthesis benchmark the audio it returns is the
+request text itself, which lets the benchmark check that the chunks came back in order; in the pipeline benchmark it
+returns MP3 data with ID3 and Xing headers for the assembler to strip. A render that fails after all its retries is
+reported as a failed row.
+
+The pipeline benchmark runs the whole headless path (convert_pdf: extraction, header/footer stripping, normalization,
+chunking, synthesis and MP3 assembly) on synthetic PDFs of the requested page counts, against the stub. Each run happens
+in a fresh process with its own empty cache, so the wall time, throughput and peak RSS are measured cleanly; pass
+--warm to render every PDF a second time on a warm cache.
+
+The chunking benchmark compares the old fixed CHUNK_SIZE slicing with the sentence packer on a large synthetic text (or
+a text file of your own): how many chunks it takes, how full they are, how many words get cut in half, and how many
+chunks change after a one-word edit.
+
+The extraction benchmark writes a synthetic PDF with the requested number of pages (or uses the PDFs you pass it) and
+compares pdfminer's serial `extract_text` with the process-pool extraction at different worker counts.
+
+The normalization benchmark times the original three-pass `re.sub` normalization against `normalize_text` on large
+synthetic texts with messy PDF-style whitespace, both on the whole document and page by page.
+
+Usage:
+
+```bash
+python PDF2SpeechBenchmark.py synthesis --chunks 40 --latency 0.5 --workers 1 4 8 --server-limit 5
+python PDF2SpeechBenchmark.py chunking --chars 5000000
+python PDF2SpeechBenchmark.py extraction --pages 300 --workers 2 4 8
+python PDF2SpeechBenchmark.py normalization --sizes 1 10 50
+python PDF2SpeechBenchmark.py pipeline --pages 50 500 --latency 0.3 --error-rate 0.02 --rate-limit 20 --workers 4 8
+```
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import textwrap
+import threading
+import multiprocessing
+from collections import deque
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_VOICE_ID = '21m00Tcm4TlvDq8ikWAM'
+MP3_FRAME = bytes([0xff, 0xfb, 0x90, 0x00]) + bytes(413)  # One silent MPEG-1 Layer III frame, 128 kbps at 44.1 kHz.
+
+
+def fake_mp3(text):
+    # An ID3 tag, a Xing header frame and one frame per 20 characters. That is far less audio than
+    # real speech, but keeps the output of a long document down to tens of megabytes.
+    id3 = b'ID3\x04\x00\x00\x00\x00\x00\x0a' + bytes(10)
+    xing = MP3_FRAME[:36] + b'Xing' + MP3_FRAME[40:]
+    return id3 + xing + MP3_FRAME * max(1, len(text) // 20)
+
+
+class StubTTSHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/voices'):
+            self.send_json(200, {'voices': [{'voice_id': STUB_VOICE_ID, 'name': 'Stub', 'category': 'premade'}]})
+        elif self.path.endswith('/settings'):
+            self.send_json(200, {'stability': 0.5, 'similarity_boost': 0.75})
+        else:
+            self.send_json(404, {'detail': {'status': 'not_found', 'message': self.path}})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        server = self.server
+
+        with server.lock:
+            server.requests += 1
+            now = time.monotonic()
+            while server.recent and server.recent[0] < now - 1:
+                server.recent.popleft()
+            if server.in_flight >= server.limit or (server.rate_limit and len(server.recent) >= server.rate_limit):
+                server.rejected += 1
+                rejected = True
+            else:
+                server.in_flight += 1
+                server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+                server.recent.append(now)
+                rejected = False
+            failed = not rejected and server.random.random() < server.error_rate
+            if failed:
+                server.failed += 1
+
+        if rejected:
+            self.send_json(429, {'detail': {'status': 'too_many_concurrent_requests',
+                                            'message': 'Too many concurrent requests (429)'}})
+            return
+
+        try:
+            time.sleep(server.latency)
+            if failed:
+                # A bare 500 without the JSON error body, like a failing proxy in front of the API.
+                body = b'Internal Server Error'
+                self.send_response(500)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            text = request.get('text', '')
+            audio = fake_mp3(text) if server.mp3 else text.encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'audio/mpeg')
+            self.send_header('Content-Length', str(len(audio)))
+            self.end_headers()
+            self.wfile.write(audio)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+
+def start_stub_server(latency, limit, error_rate=0.0, rate_limit=0, mp3=False, seed=1):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubTTSHandler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    server.latency = latency
+    server.limit = limit
+    server.error_rate = error_rate
+    server.rate_limit = rate_limit
+    server.mp3 = mp3
+    server.random = random.Random(seed)
+    server.recent = deque()
+    server.lock = threading.Lock()
+    server.requests = server.rejected = server.failed = server.in_flight = server.peak_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def reset_stub_counters(server):
+    with server.lock:
+        server.requests = server.rejected = server.failed = server.peak_in_flight = 0
+
+
+def stub_url(server):
+    return f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+
+def import_pdf2speech(base_url=None):
+    # elevenlabs reads ELEVEN_BASE_URL when it is imported, so this has to happen first.
+    if base_url:
+        os.environ['ELEVEN_BASE_URL'] = base_url
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import PDF2Speech
+    PDF2Speech.set_api_key('stub')
+    return PDF2Speech
+
+
+def bench_synthesis(args):
+    server = start_stub_server(args.latency, args.server_limit)
+    pdf2speech = import_pdf2speech(stub_url(server))
+    pdf2speech.RATE_LIMIT_BACKOFF = args.backoff
+
+    chunks = [f'Chunk {i}. ' + 'Lorem ipsum dolor sit amet. ' * 20 for i in range(args.chunks)]
+    request = lambda chunk: pdf2speech.generate(chunk, voice=STUB_VOICE_ID, model='eleven_monolingual_v1')
+
+    print(f"{'workers':>8} {'wall s':>8} {'chunks/s':>9} {'speedup':>8} {'requests':>9} {'429s':>6} {'peak':>5} ordered")
+    baseline = None
+    for workers in args.workers:
+        reset_stub_counters(server)
+        start = time.perf_counter()
+        synthesize = pdf2speech.RateLimitBackoff().wrap(request)
+        audio = list(pdf2speech.synthesize_chunks(chunks, synthesize, max_workers=workers))
+        wall = time.perf_counter() - start
+        baseline = baseline or wall
+        ordered = audio == [chunk.encode() for chunk in chunks]
+        print(f"{workers:>8} {wall:>8.2f} {len(chunks) / wall:>9.2f} {baseline / wall:>7.2f}x "
+              f"{server.requests:>9} {server.rejected:>6} {server.peak_in_flight:>5} {ordered}")
+
+    server.shutdown()
+
+
+WORDS = ('the sound design of every scene depends on careful layering of ambience foley dialogue and music '
+         'while the mix engineer balances loudness against dynamic range for each delivery format across '
+         'film television games and immersive audio where spatial placement matters as much as tone').split()
+
+
+def synthetic_text(chars, seed=1):
+    rng = random.Random(seed)
+    sentences = []
+    length = 0
+    while length < chars:
+        words = rng.choices(WORDS, k=rng.randint(4, 40))
+        sentence = ' '.join(words).capitalize() + rng.choice('...?!')
+        sentences.append(sentence)
+        length += len(sentence) + 1
+    return ' '.join(sentences)
+
+
+def fixed_chunks(text, budget):
+    return [text[i: i + budget] for i in range(0, len(text), budget)]
+
+
+def edit_one_word(text, position):
+    # Insert a word at the first space after position.
+    i = text.index(' ', position)
+    return text[:i] + ' inserted' + text[i:]
+
+
+def pdf_escape(line):
+    return line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def write_synthetic_pdf(path, pages, seed=1, lines_per_page=48):
+    # A plain PDF 1.4 file written without any PDF library: per page, a running header, a block of
+    # Helvetica body text and a page-number footer.
+    lines = textwrap.wrap(synthetic_text(pages * lines_per_page * 90, seed), 90)
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    page_ids = []
+    for page in range(pages):
+        page_lines = lines[page * lines_per_page: (page + 1) * lines_per_page]
+        text = ' T* '.join(f'({pdf_escape(line)}) Tj' for line in page_lines)
+        stream = (f'BT /F1 9 Tf 40 770 Td (Synthetic Sound Design Manual - Benchmark Edition) Tj ET '
+                  f'BT /F1 10 Tf 14 TL 40 740 Td {text} ET '
+                  f'BT /F1 9 Tf 290 30 Td (Page {page + 1}) Tj ET').encode('latin-1')
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % (len(objects)))
+        page_ids.append(len(objects))
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids).encode()
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, pages)
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n')
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(f.tell())
+            f.write(b'%d 0 obj\n%s\nendobj\n' % (number, body))
+        xref = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b'%010d 00000 n \n' % offset)
+        f.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref))
+    return path
+
+
+def bench_extraction(args):
+    pdf2speech = import_pdf2speech()
+    pdf_paths = args.pdf
+    if not pdf_paths:
+        tmp_dir = tempfile.mkdtemp()
+        pdf_paths = [write_synthetic_pdf(os.path.join(tmp_dir, f'synthetic_{args.pages}.pdf'), args.pages)]
+
+    for pdf_path in pdf_paths:
+        pages = pdf2speech.count_pdf_pages(pdf_path)
+        print(f"{os.path.basename(pdf_path)}: {pages} pages, batches of {args.batch_pages}")
+        print(f"{'mode':>12} {'wall s':>8} {'pages/s':>8} {'speedup':>8} identical")
+
+        start = time.perf_counter()
+        serial_text = pdf2speech.extract_text(pdf_path)
+        serial = time.perf_counter() - start
+        print(f"{'serial':>12} {serial:>8.2f} {pages / serial:>8.1f} {1:>7.2f}x True")
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            text = pdf2speech.extract_text_parallel(pdf_path, workers=workers, batch_pages=args.batch_pages)
+            wall = time.perf_counter() - start
+            print(f"{f'{workers} workers':>12} {wall:>8.2f} {pages / wall:>8.1f} {serial / wall:>7.2f}x "
+                  f"{text == serial_text}")
+
+
+def legacy_normalize(text):
+    # load_pdf's normalization before the single-pass rewrite.
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r" +", " ", text)
+    text = re.sub(r"\n+", "\n", text)
+    return text
+
+
+def messy_text(chars, seed=1, page_chars=3000):
+    # Synthetic text with the whitespace pdfminer produces: wrapped lines, runs of spaces,
+    # tabs, blank lines between paragraphs and a form feed every page_chars characters.
+    rng = random.Random(seed)
+    separators = [' '] * 12 + ['  ', '   ', '\t', '\n', ' \n', '\n\n', ' \n \n']
+    parts = []
+    length = 0
+    next_page = page_chars
+    while length < chars:
+        word = rng.choice(WORDS)
+        separator = rng.choice(separators)
+        if length >= next_page:
+            separator = '\n\x0c'
+            next_page += page_chars
+        parts.append(word + separator)
+        length += len(word) + len(separator)
+    return ''.join(parts)
+
+
+def bench_normalization(args):
+    pdf2speech = import_pdf2speech()
+    normalizers = {
+        'legacy': legacy_normalize,
+        'single-pass': pdf2speech.normalize_text,
+        'paged': lambda text: list(pdf2speech.normalize_pages(text.split('\x0c'))),
+    }
+
+    print(f"{'size MB':>8} {'normalizer':>12} {'best s':>8} {'MB/s':>8} {'speedup':>8}")
+    for size in args.sizes:
+        text = messy_text(int(size * 1e6))
+        baseline = None
+        for name, normalize in normalizers.items():
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                normalize(text)
+                times.append(time.perf_counter() - start)
+            best = min(times)
+            baseline = baseline or best
+            print(f"{size:>8} {name:>12} {best:>8.3f} {len(text) / best / 1e6:>8.1f} {baseline / best:>7.2f}x")
+
+
+def peak_rss_mb(who):
+    import resource
+    rss = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return rss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+def run_pipeline(config):
+    # Runs in a fresh process, so the cache is cold and ru_maxrss belongs to this render alone.
+    import resource
+    pdf2speech = import_pdf2speech(config['base_url'])
+    pdf2speech.MAX_CONCURRENT_REQUESTS = config['workers']
+    pdf2speech.RATE_LIMIT_BACKOFF = config['backoff']
+    pdf2speech.CHUNK_RETRY_BACKOFF = config['backoff']
+    pdf2speech.CACHE_DIR = os.path.join(config['workdir'], 'cache')
+    pdf2speech.JOBS_DIR = os.path.join(config['workdir'], 'jobs')
+
+    argv = [config['pdf'], '--voice', STUB_VOICE_ID, '--overwrite', '--trace-dir', config['workdir']]
+    args = pdf2speech.parse_args(argv + (['--stream'] if config['stream'] else []))
+    output_path = os.path.join(config['workdir'], 'render.mp3')
+
+    results = []
+    for _ in range(2 if config['warm'] else 1):
+        start = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            pdf2speech.convert_pdf(config['pdf'], output_path, STUB_VOICE_ID, args)
+        wall = time.perf_counter() - start
+        with open(os.path.join(config['workdir'], 'render.mp3.trace.json')) as f:
+            summary = json.load(f)['summary']
+        results.append({'wall': wall, 'summary': summary, 'output_bytes': os.path.getsize(output_path)})
+
+    return {
+        'runs': results,
+        'rss': peak_rss_mb(resource.RUSAGE_SELF),
+        'children_rss': peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+
+def bench_pipeline(args):
+    server = start_stub_server(args.latency, args.server_limit, args.error_rate, args.rate_limit, mp3=True)
+    context = multiprocessing.get_context('spawn')
+    tmp_dir = tempfile.mkdtemp()
+
+    print(f"stub: {args.latency}s latency, {args.server_limit} concurrent, "
+          f"{args.rate_limit or 'unlimited'} req/s, {args.error_rate:.0%} errors")
+    print(f"{'pages':>6} {'mode':>7} {'workers':>7} {'run':>5} {'wall s':>7} {'pages/s':>8} {'chars/s':>8} "
+          f"{'reqs':>5} {'429s':>5} {'500s':>5} {'p50 s':>6} {'p95 s':>6} {'RSS MB':>7} {'pool MB':>8}")
+    for pages in args.pages:
+        pdf_path = write_synthetic_pdf(os.path.join(tmp_dir, f'synthetic_{pages}.pdf'), pages)
+        for mode in args.modes:
+            for workers in args.workers:
+                workdir = tempfile.mkdtemp(dir=tmp_dir)
+                config = {'base_url': stub_url(server), 'pdf': pdf_path, 'workdir': workdir, 'workers': workers,
+                          'stream': mode == 'stream', 'warm': args.warm, 'backoff': args.backoff}
+                reset_stub_counters(server)
+                with context.Pool(1) as pool:
+                    try:
+                        result = pool.apply(run_pipeline, (config,))
+                    except Exception as e:
+                        # A render that still fails after its retries is a result too; the other runs go on.
+                        print(f"{pages:>6} {mode:>7} {workers:>7} {'cold':>5} failed after {server.requests} requests "
+                              f"({server.rejected} 429s, {server.failed} 500s): {type(e).__name__}: {e}")
+                        continue
+
+                for run, measured in zip(('cold', 'warm'), result['runs']):
+                    summary = measured['summary']
+                    # The warm run is served from the cache, so the stub's counters belong to the cold run.
+                    rejected, failed = (server.rejected, server.failed) if run == 'cold' else ('-', '-')
+                    p50 = f"{summary['latency_p50']:.2f}" if summary['latency_p50'] is not None else '-'
+                    p95 = f"{summary['latency_p95']:.2f}" if summary['latency_p95'] is not None else '-'
+                    print(f"{pages:>6} {mode:>7} {workers:>7} {run:>5} {measured['wall']:>7.2f} "
+                          f"{pages / measured['wall']:>8.1f} {summary['characters_per_second'] or 0:>8.0f} "
+                          f"{summary['requests']:>5} {rejected:>5} {failed:>5} {p50:>6} {p95:>6} "
+                          f"{result['rss']:>7.1f} {result['children_rss']:>8.1f}")
+
+    server.shutdown()
+
+
+def bench_chunking(args):
+    pdf2speech = import_pdf2speech()
+    if args.text:
+        with open(args.text) as f:
+            text = f.read()
+    else:
+        text = synthetic_text(args.chars)
+    edited = edit_one_word(text, int(len(text) * args.edit_at))
+    budget = args.budget or pdf2speech.CHUNK_SIZE
+
+    chunkers = {
+        'fixed': lambda t: fixed_chunks(t, budget),
+        'sentence': lambda t: pdf2speech.chunk_text(t, budget),
+    }
+
+    print(f"{len(text):,} characters, budget {budget}, one-word edit at {args.edit_at:.0%}")
+    print(f"{'chunker':>9} {'chunks':>7} {'fill':>7} {'split words':>12} {'changed':>8} {'MB/s':>7}")
+    for name, chunker in chunkers.items():
+        start = time.perf_counter()
+        chunks = chunker(text)
+        elapsed = time.perf_counter() - start
+
+        fill = sum(len(chunk) for chunk in chunks) / (len(chunks) * budget)
+        split_words = sum(1 for a, b in zip(chunks, chunks[1:]) if a[-1:].isalnum() and b[:1].isalnum())
+        before = set(chunks)
+        changed = sum(1 for chunk in chunker(edited) if chunk not in before)
+        print(f"{name:>9} {len(chunks):>7} {fill:>7.1%} {split_words:>12} {changed:>8} "
+              f"{len(text) / elapsed / 1e6:>7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmarks for PDF2Speech.py')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    synthesis = subparsers.add_parser('synthesis', help='Concurrent chunk synthesis against a stub TTS endpoint')
+    synthesis.add_argument('--chunks', type=int, default=40)
+    synthesis.add_argument('--latency', type=float, default=0.5, help='Seconds the stub waits before answering')
+    synthesis.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    synthesis.add_argument('--server-limit', type=int, default=5, help='Concurrent requests before the stub sends 429s')
+    synthesis.add_argument('--backoff', type=float, default=0.2, help='Initial rate-limit backoff in seconds')
+    synthesis.set_defaults(run=bench_synthesis)
+
+    chunking = subparsers.add_parser('chunking', help='Chunk count, fill ratio and edit stability of the chunker')
+    chunking.add_argument('--chars', type=int, default=2000000, help='Size of the synthetic text')
+    chunking.add_argument('--text', help='Use this text file instead of synthetic text')
+    chunking.add_argument('--budget', type=int, help='Characters per request (defaults to CHUNK_SIZE)')
+    chunking.add_argument('--edit-at', type=float, default=0.1, help='Where to make the one-word edit (0-1)')
+    chunking.set_defaults(run=bench_chunking)
+
+    extraction = subparsers.add_parser('extraction', help='Serial vs process-pool PDF text extraction')
+    extraction.add_argument('pdf', nargs='*', help='PDFs to extract (defaults to a synthetic PDF)')
+    extraction.add_argument('--pages', type=int, default=300, help='Pages in the synthetic PDF')
+    extraction.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8])
+    extraction.add_argument('--batch-pages', type=int, default=16)
+    extraction.set_defaults(run=bench_extraction)
+
+    normalization = subparsers.add_parser('normalization', help='Legacy vs single-pass text normalization')
+    normalization.add_argument('--sizes', type=float, nargs='+', default=[1, 10, 50], help='Text sizes in MB')
+    normalization.add_argument('--repeat', type=int, default=3, help='Runs per normalizer; the best is reported')
+    normalization.set_defaults(run=bench_normalization)
+
+    pipeline = subparsers.add_parser('pipeline', help='Whole PDF-to-MP3 renders of synthetic PDFs against the stub')
+    pipeline.add_argument('--pages', type=int, nargs='+', default=[50, 300], help='Page counts of the synthetic PDFs')
+    pipeline.add_argument('--modes', nargs='+', choices=['full', 'stream'], default=['full', 'stream'])
+    pipeline.add_argument('--workers', type=int, nargs='+', default=[4], help='Concurrent requests per render')
+    pipeline.add_argument('--latency', type=float, default=0.3, help='Seconds the stub waits before answering')
+    pipeline.add_argument('--server-limit', type=int, default=8, help='Concurrent requests before the stub sends 429s')
+    pipeline.add_argument('--rate-limit', type=int, default=0, help='Requests per second before 429s (0: no limit)')
+    pipeline.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 500')
+    pipeline.add_argument('--backoff', type=float, default=0.2, help='Initial backoff in seconds')
+    pipeline.add_argument('--warm', action='store_true', help='Render each PDF again on the warm cache')
+    pipeline.set_defaults(run=bench_pipeline)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+# Install Manifest
+#
+# Description:
+# Differential installs for the plugin installers. A manifest kept for each destination folder records, for every
+# bundle the installer put there, the size, modification time and SHA-256 of each of its files. The next install
+# compares the source folder with it and only copies files that are new or changed, removes files that were dropped
+# from a bundle (bundles missing from the source folder are left alone) and skips everything else, so re-running an
+# install on an up-to-date machine only costs a stat of each file. Symlinks, which framework bundles are full of
+# (Versions/Current -> A), are recorded with their target and installed as links, never followed.
+#
+# Files that an install overwrites or removes are first moved into a backup folder next to the manifest, together with
+# the previous manifest and the list of files the install added. rollback() undoes the last install from it.
+#
+# Manifests and backups are kept out of the plugin folders, which hosts scan recursively (a backup of half a .vst3
+# bundle would show up as a plugin), in a folder per destination under STATE_DIR: the user's application data folder,
+# or PLUGIN_INSTALL_STATE if it is set.
+#
+# Author: Samuel Justice
+#
+# Functions:
+# - InstallPlan(src, dest, skip): Works out what an install of 'src' into 'dest', less the items in 'skip', has to
+#   copy, replace and remove.
+# - InstallPlan.backup() / InstallPlan.commit(): Moves the old files aside, and writes the new manifest afterwards.
+# - rollback(dest): Restores the files and manifest from before the last install into 'dest'.
+# - manifest_path(dest) / backup_path(dest): Where the manifest and backup folder of 'dest' are kept.
+# - remove_link(path): Removes a symlink, to a folder too.
+
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+
+MANIFEST_NAME = 'manifest.json'
+BACKUP_NAME = 'backup'
+if sys.platform == 'win32':
+    DEFAULT_STATE_DIR = os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'PluginInstaller', 'installs')
+elif sys.platform == 'darwin':
+    DEFAULT_STATE_DIR = os.path.expanduser('~/Library/Application Support/PluginInstaller/installs')
+else:
+    DEFAULT_STATE_DIR = os.path.expanduser('~/.plugininstaller/installs')
+STATE_DIR = os.environ.get('PLUGIN_INSTALL_STATE', DEFAULT_STATE_DIR)
+HASH_BLOCK_SIZE = 1024 * 1024
+LINK_PREFIX = 'link:'
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def link_entry(link):
+    # A symlink's manifest entry: no size or time of its own, and its target in place of a digest.
+    return [0, 0, LINK_PREFIX + link]
+
+
+def state_dir(dest):
+    # Named after the destination's folder, with a hash of its full path so two 'VST3' folders don't collide.
+    dest = os.path.abspath(dest)
+    name = os.path.basename(dest) or 'root'
+    return os.path.join(STATE_DIR, f"{name}-{hashlib.sha1(dest.encode('utf-8')).hexdigest()[:12]}")
+
+
+def manifest_path(dest):
+    return os.path.join(state_dir(dest), MANIFEST_NAME)
+
+
+def backup_path(dest):
+    return os.path.join(state_dir(dest), BACKUP_NAME)
+
+
+def remove_link(path):
+    if sys.platform == 'win32' and os.path.isdir(path):
+        os.rmdir(path)  # A link to a folder is removed like a folder on Windows
+    else:
+        os.remove(path)
+
+
+def move(source, target):
+    # A rename, unless the backup folder is on another drive than the destination. shutil.move would put the file
+    # inside a link to a folder that is in the way, so that goes first.
+    try:
+        os.replace(source, target)
+    except OSError:
+        if os.path.islink(target):
+            remove_link(target)
+        shutil.move(source, target)
+
+
+def load_manifest(dest):
+    try:
+        with open(manifest_path(dest)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def manifest_files(manifest):
+    # Relative path -> [size, mtime_ns, sha256] (or a link entry) over all bundles of a manifest.
+    files = {}
+    for bundle in (manifest or {}).get('bundles', {}).values():
+        files.update(bundle)
+    return files
+
+
+class InstallPlan:
+    def __init__(self, src, dest, skip=()):
+        self.src = src
+        self.dest = dest
+        self.previous = load_manifest(dest)
+        self.folders = []  # Relative folders in the source, empty ones included
+        self.copy = []  # (relative path, size) of new and changed files
+        self.replace = []  # Changed files that already exist in the destination
+        self.remove = []  # Files dropped from a bundle since the last install
+        self.unchanged = 0
+        self.stale = False  # Set when only the recorded times changed, so the manifest is worth rewriting anyway
+        self.bundles = {}
+
+        installed = manifest_files(self.previous)
+        for item in sorted(os.listdir(src)):
+            if item in skip:
+                continue  # Left as it is, manifest entries included
+            bundle = self.bundles[item] = {}
+            item_path = os.path.join(src, item)
+            if os.path.islink(item_path):
+                self.add_link(item, bundle, installed)
+            elif os.path.isdir(item_path):
+                for dirpath, dirnames, filenames in os.walk(item_path):
+                    relative = os.path.relpath(dirpath, src)
+                    self.folders.append(relative)
+                    # os.walk lists symlinks to folders with the folders, but doesn't go into them.
+                    links = [name for name in dirnames + filenames if os.path.islink(os.path.join(dirpath, name))]
+                    for name in links:
+                        self.add_link(os.path.join(relative, name), bundle, installed)
+                    for filename in filenames:
+                        if filename not in links:
+                            self.add_file(os.path.join(relative, filename), bundle, installed)
+            else:
+                self.add_file(item, bundle, installed)
+
+            # Only bundles that are being installed lose files; other bundles in the manifest are left as they are.
+            previous_bundle = (self.previous or {}).get('bundles', {}).get(item, {})
+            self.remove.extend(path for path in previous_bundle if path not in bundle
+                               and os.path.lexists(os.path.join(dest, path)))
+
+    def add_file(self, relative_path, bundle, installed):
+        info = os.stat(os.path.join(self.src, relative_path))
+        entry = installed.get(relative_path)
+        target = os.path.join(self.dest, relative_path)
+        try:
+            target_size = os.stat(target).st_size
+        except OSError:
+            target_size = None
+
+        # Same size and time as at the last install, and still there: nothing to read, nothing to copy.
+        if entry and entry[:2] == [info.st_size, info.st_mtime_ns] and target_size == info.st_size:
+            bundle[relative_path] = entry
+            self.unchanged += 1
+            return
+
+        digest = file_digest(os.path.join(self.src, relative_path))
+        bundle[relative_path] = [info.st_size, info.st_mtime_ns, digest]
+        if entry and entry[2] == digest and target_size == info.st_size:
+            self.unchanged += 1  # Touched but identical
+            self.stale = True
+            return
+        self.copy.append((relative_path, info.st_size))
+        if target_size is not None:
+            self.replace.append(relative_path)
+
+    def add_link(self, relative_path, bundle, installed):
+        entry = bundle[relative_path] = link_entry(os.readlink(os.path.join(self.src, relative_path)))
+        target = os.path.join(self.dest, relative_path)
+        if os.path.islink(target) and link_entry(os.readlink(target)) == entry:
+            self.unchanged += 1
+            self.stale = self.stale or installed.get(relative_path) != entry
+            return
+        self.copy.append((relative_path, 0))
+        if os.path.lexists(target):
+            self.replace.append(relative_path)
+
+    def changed(self):
+        return bool(self.copy or self.remove)
+
+    def added(self):
+        replaced = set(self.replace)
+        return [path for path, _ in self.copy if path not in replaced]
+
+    def installed_items(self):
+        # The top-level items that had files copied into them.
+        return sorted({path.split(os.sep, 1)[0] for path, _ in self.copy})
+
+    def summary(self):
+        return (f"{len(self.copy) - len(self.replace)} new, {len(self.replace)} changed, {len(self.remove)} removed, "
+                f"{self.unchanged} unchanged")
+
+    def manifest(self):
+        bundles = dict((self.previous or {}).get('bundles', {}))
+        bundles.update(self.bundles)
+        return {'installed_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'source': os.path.abspath(self.src),
+                'bundles': bundles}
+
+    def write_manifest(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.manifest(), f)
+
+    def write_backup_metadata(self, folder):
+        # What rollback needs besides the backed up files: the manifest to go back to and the files to delete.
+        if self.previous is not None:
+            with open(os.path.join(folder, 'manifest.json'), 'w') as f:
+                json.dump(self.previous, f)
+        with open(os.path.join(folder, 'added.txt'), 'w') as f:
+            f.write(''.join(f"{path}\n" for path in self.added()))
+
+    def backup(self):
+        # Only the last install can be rolled back, so the backup folder from the one before goes.
+        backup_dir = backup_path(self.dest)
+        shutil.rmtree(backup_dir, ignore_errors=True)
+        os.makedirs(os.path.join(backup_dir, 'files'))
+        for path in self.replace + self.remove:
+            target = os.path.join(backup_dir, 'files', path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            move(os.path.join(self.dest, path), target)
+        self.write_backup_metadata(backup_dir)
+
+    def commit(self):
+        path = manifest_path(self.dest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.write_manifest(f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+
+def rollback(dest):
+    backup_dir = backup_path(dest)
+    if not os.path.isdir(backup_dir):
+        return f"Nothing to roll back in {dest}\n"
+
+    with open(os.path.join(backup_dir, 'added.txt')) as f:
+        added = f.read().splitlines()
+    for path in added:
+        try:
+            os.remove(os.path.join(dest, path))
+        except OSError:
+            pass
+
+    files_dir = os.path.join(backup_dir, 'files')
+    restored = 0
+    for dirpath, dirnames, filenames in os.walk(files_dir):
+        for filename in filenames + [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]:
+            source = os.path.join(dirpath, filename)
+            target = os.path.join(dest, os.path.relpath(source, files_dir))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            move(source, target)
+            restored += 1
+
+    previous_manifest = os.path.join(backup_dir, 'manifest.json')
+    if os.path.exists(previous_manifest):
+        os.replace(previous_manifest, manifest_path(dest))
+    elif os.path.exists(manifest_path(dest)):
+        os.remove(manifest_path(dest))
+    shutil.rmtree(backup_dir)
+    return f"Rolled back {dest}: removed {len(added)} added files, restored {restored}\n"
@@ -0,0 +1,188 @@
+# Install Planner
+#
+# Description:
+# Runs an install as an explicit plan of steps. The installers first add a step per destination copy and per package
+# installer, the plan can be shown as a dry run, and then the steps run: copies to different destinations don't depend
+# on each other and run side by side, up to a parallelism limit, while package installers run one after another on a
+# lane of their own (macOS' installer and msiexec both refuse a second install while one is running), alongside the
+# copies rather than after all of them. Every step is timed and reported as soon as it finishes.
+#
+# The command used to run a package installer comes from a table per extension in each installer. Setting
+# PLUGIN_INSTALLER_COMMAND replaces it for every package ('{path}' is replaced by the package's path), so with a stub
+# command and PLUGIN_INSTALL_ROOT the whole plan can be run on Linux, e.g.
+# PLUGIN_INSTALLER_COMMAND="/bin/echo installing {path}" PLUGIN_INSTALL_ROOT=/tmp/plugin-root
+#
+# Both installers build their plan with build_plan, from a folder or a zip archive alike: the inventory check and the
+# differential plan (InstallPlan or ZipInstall.plan) are done for every destination up front, so the dry run shows what
+# each copy will do. Only how a folder or an archive is actually copied, and how a command is shown, differ per
+# platform, and those are passed in.
+#
+# Author: Samuel Justice
+#
+# Functions:
+# - InstallPlanner.add(name, description, action, serial, notes): Adds a step; 'action' returns the step's output and
+#   'notes' are warnings to show with it, such as the inventory's.
+# - InstallPlanner.dry_run(): The plan as text.
+# - InstallPlanner.run(parallel, report): Runs the plan, passing each step's output and timing to 'report'.
+# - build_plan(folder_path, destinations, ...): The install of a folder or zip archive as a plan, with the temporary
+#   folder the installers in a zip are unpacked to, if any.
+# - installer_command(commands, path): The command that installs the package at 'path'.
+# - installer_packages(commands, folder): The packages in 'folder' that there is a command for.
+# - run_installer(commands, path): Runs the installer command for the package at 'path'.
+
+import os
+import glob
+import time
+import queue
+import shlex
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from InstallManifest import InstallPlan
+from ZipInstall import ZipInstall, archive_versions, extract_folder
+
+INSTALL_PARALLEL = int(os.environ.get('PLUGIN_INSTALL_PARALLEL', '3'))  # Steps that run at the same time
+INSTALLER_COMMAND = os.environ.get('PLUGIN_INSTALLER_COMMAND', '')
+
+
+def installer_command(commands, path):
+    if INSTALLER_COMMAND:
+        template = shlex.split(INSTALLER_COMMAND, posix=os.name != 'nt')
+    else:
+        template = commands[os.path.splitext(path)[1].lower()]
+    return [part.replace('{path}', path) for part in template]
+
+
+def installer_packages(commands, folder):
+    # Packages in the order the installers always ran them: by extension, in the order of the table.
+    return [path for extension in commands for path in sorted(glob.glob(f"{folder}/*{extension}"))]
+
+
+def run_installer(commands, path):
+    try:
+        subprocess.run(installer_command(commands, path), check=True)
+        return f"Installed {path}\n"
+    except (subprocess.CalledProcessError, OSError) as e:
+        print(e)
+        return f"Failed to install {path}\n"
+
+
+class InstallStep:
+    def __init__(self, name, description, action, serial, notes):
+        self.name = name
+        self.description = description
+        self.action = action
+        self.serial = serial
+        self.notes = notes
+        self.output = ''
+        self.seconds = None
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            self.output = self.notes + self.action()
+        except Exception as e:
+            self.output = self.notes + f"{self.name} failed: {e}\n"
+        self.seconds = time.perf_counter() - start
+        return self
+
+
+class InstallPlanner:
+    def __init__(self):
+        self.steps = []
+
+    def add(self, name, description, action, serial=False, notes=''):
+        self.steps.append(InstallStep(name, description, action, serial, notes))
+
+    def dry_run(self, parallel=None):
+        parallel = parallel or INSTALL_PARALLEL
+        lines = [f"Install plan: {len(self.steps)} steps, up to {parallel} at a time"]
+        for number, step in enumerate(self.steps, 1):
+            lines.append(f"{number:>2}. {step.name}{' (installers, one at a time)' if step.serial else ''}: "
+                         f"{step.description}")
+            lines.extend(f"    {note}" for note in step.notes.splitlines())
+        return '\n'.join(lines) + '\n'
+
+    def run_serial(self, steps, done):
+        for step in steps:
+            done.put(step.run())
+
+    def run(self, parallel=None, report=print):
+        # Steps finish on worker threads but are reported on the calling thread, so 'report' can write to the GUI.
+        parallel = max(1, parallel or INSTALL_PARALLEL)
+        done = queue.Queue()
+        start = time.perf_counter()
+        serial = [step for step in self.steps if step.serial]
+        with ThreadPoolExecutor(max_workers=parallel) as pool:
+            if serial:
+                pool.submit(self.run_serial, serial, done)
+            for step in self.steps:
+                if not step.serial:
+                    pool.submit(lambda step=step: done.put(step.run()))
+            for _ in self.steps:
+                step = done.get()
+                report(f"[{step.seconds:6.1f}s] {step.name}\n{step.output}")
+        elapsed = time.perf_counter() - start
+        report(f"Finished {len(self.steps)} steps in {elapsed:.1f}s "
+               f"({sum(step.seconds for step in self.steps):.1f}s if run one after another)\n")
+
+
+def build_plan(folder_path, destinations, installer_commands, destination_path, inventory, copy_action, zip_action,
+               format_command, skip_same_version=True, progress=None):
+    # One step per destination that has something to install and one per package installer. copy_action(src, dest,
+    # skip, install) and zip_action(archive, folder, dest, skip, install) run a destination's step with its plan, and
+    # format_command shows an installer command the way the platform's shell would take it.
+    archive = folder_path if folder_path.lower().endswith('.zip') else None
+    planner = InstallPlanner()
+    missing = []
+    for folder, dest in destinations.items():
+        src = f"{folder_path}/{folder}"
+        absolute_dest = destination_path(dest)
+        if archive:
+            skip, notes = inventory.check_versions(archive_versions(archive, folder), absolute_dest, skip_same_version)
+            install = ZipInstall(archive, folder, absolute_dest, skip, progress)
+            try:
+                if not install.exists():
+                    missing.append(folder)
+                    continue
+                install.plan()
+            finally:
+                install.close()  # Opened again by the install step, so a dry run leaves nothing open
+            size = sum(size for _, size in install.copy)
+            planner.add(folder, f"{archive}/{folder} -> {absolute_dest} ({install.summary()}, {size / 1e6:.1f} MB to extract)",
+                        lambda folder=folder, dest=dest, skip=skip, install=install:
+                        zip_action(archive, folder, dest, skip, install), notes=notes)
+        else:
+            if not os.path.isdir(src) or not os.listdir(src):
+                missing.append(folder)
+                continue
+            skip, notes = inventory.check_install(src, absolute_dest, skip_same_version)
+            install = InstallPlan(src, absolute_dest, skip)
+            size = sum(size for _, size in install.copy)
+            planner.add(folder, f"{src} -> {absolute_dest} ({install.summary()}, {size / 1e6:.1f} MB to copy)",
+                        lambda src=src, dest=dest, skip=skip, install=install: copy_action(src, dest, skip, install),
+                        notes=notes)
+        if progress:
+            progress.add_total(len(install.copy), size)
+
+    staging = None
+    paths = []
+    if archive:
+        # Package installers have to be files on disk to run, so they are the one part of a zip that gets unpacked.
+        packages = ZipInstall(archive, 'INSTALLERS', '')
+        packages.close()
+        names = [name for extension in installer_commands for name in sorted(packages.bundles)
+                 if name.lower().endswith(extension)]
+        if names:
+            staging = tempfile.mkdtemp()
+            planner.add('INSTALLERS', f"unpack {len(names)} installers from {archive}",
+                        lambda: f"Unpacked {len(extract_folder(archive, 'INSTALLERS', staging).copy)} files\n",
+                        serial=True)
+            paths = [os.path.join(staging, name) for name in names]
+    else:
+        paths = installer_packages(installer_commands, f"{folder_path}/INSTALLERS")
+    for path in paths:
+        planner.add(os.path.basename(path), format_command(installer_command(installer_commands, path)),
+                    lambda path=path: run_installer(installer_commands, path), serial=True)
+    return planner, missing, staging
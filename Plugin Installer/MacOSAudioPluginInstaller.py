@@ -7,8 +7,24 @@
 #
 # Features:
 # 1. "Create Folder Structure" creates a default directory structure where plugins will be placed. Place .VST files in the VST folder, .VST3 files in the VST3 folder, .component files in the AU folder and .aax files in the AAX folder
-# 2. "Select Folder" allows users to specify the source directory containing the plugins.
+# 2. "Select Folder" allows users to specify the source directory containing the plugins. "Select Zip" picks a zip
+#    archive with the same layout instead, which is installed straight from the archive (see ZipInstall.py).
 # 3. "Execute Install" initiates the copying of plugin files from source to destination and runs package installers.
+#    The install is built as a plan first and shown in the output (see InstallPlanner.py); "Dry Run" only shows it.
+#    Copies to the different destinations run side by side, up to "Parallel Steps" at a time, the package installers
+#    run one after another next to them, and each step is reported with its time as it finishes.
+#    Each destination is handled by a single privileged shell that copies the folder and then fixes the ownership and
+#    permissions of just the items that were installed, instead of two sudo processes per item already in the folder.
+#    Installs are differential: a manifest for each destination (see InstallManifest.py) records what was installed,
+#    so only new and changed files are copied and re-running an install on an up-to-date machine copies nothing.
+#    Before copying, the plugin inventory warns about downgrades and skips bundles whose version is already installed.
+# 4. "Installed Plugins" lists the plugins in the destinations with their versions.
+# 5. "Roll Back Last Install" puts back the files the last install replaced or removed and deletes the ones it added.
+#
+# Destinations:
+# The install locations are set in DESTINATIONS. Setting PLUGIN_INSTALL_ROOT puts all of them under that directory
+# (for example /tmp/plugin-root/Library/Audio/Plug-Ins/VST3), and PLUGIN_INSTALL_SUDO=0 runs the copy without sudo,
+# so installs can be tested and benchmarked in a temp directory, on Linux too.
 # 
 # Author: Samuel Justice
 # Created On: 2023-10-05
@@ -17,32 +33,65 @@
 # Dependencies:
 # - Tkinter for GUI
 # - shutil for file operations
-# - glob for file pattern matching
 # - subprocess for executing shell commands
 # - os for file and directory operations
 #
 # Functions:
 # - select_folder(): Opens a dialog box to allow folder selection.
 # - create_folder_structure(): Creates a default folder structure in the specified location.
-# - execute_install(): Initiates the installation process.
-# - copy_files(src, dest): Copies files from 'src' directory to 'dest' directory.
+# - build_plan(FOLDER_PATH): The install of a folder or zip archive as a plan of steps.
+# - execute_install(dry_run): Shows the plan, then runs it unless it is a dry run.
+# - zip_files(archive, folder, dest, skip, install): Installs 'folder' of a zip archive into 'dest'.
+# - copy_files(src, dest, skip, install): Copies files from 'src' directory to 'dest' directory, leaving out the items in 'skip'.
+# - show_inventory(): Lists the installed plugins and their versions from the inventory (see PluginInventory.py).
+# - destination_path(dest): Resolves a destination, applying PLUGIN_INSTALL_ROOT.
+# - rollback_files(dest): Undoes the last install into 'dest'.
 #
 # Usage:
 # Execute this script to open the GUI. Use the buttons provided to perform actions.
 
-import tkinter as tk
-from tkinter import filedialog
-from tkinter import scrolledtext
 import shutil
-import glob
+import shlex
 import subprocess
 import os
-import stat
+import sys
+import zipfile
+import tempfile
+
+from InstallManifest import InstallPlan, STATE_DIR, state_dir, manifest_path, backup_path
+from PluginInventory import PluginInventory
+from ZipInstall import ZipInstall
+from InstallPlanner import INSTALL_PARALLEL, build_plan as planner_build_plan
+
+ZIP_INSTALL_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ZipInstall.py')
+
+INSTALL_ROOT = os.environ.get('PLUGIN_INSTALL_ROOT', '')
+USE_SUDO = os.environ.get('PLUGIN_INSTALL_SUDO', '1') != '0'
+DESTINATIONS = {
+    'VST': '/Library/Audio/Plug-Ins/VST',
+    'VST3': '/Library/Audio/Plug-Ins/VST3',
+    'AU': '/Library/Audio/Plug-Ins/Components',
+    'AAX': '/Library/Application Support/Avid/Audio/Plug-Ins',
+    'DOCUMENTS': '~/Documents',
+}
+# How each kind of package in INSTALLERS is installed; PLUGIN_INSTALLER_COMMAND replaces these (see InstallPlanner.py).
+INSTALLER_COMMANDS = {
+    '.pkg': (["sudo"] if USE_SUDO else []) + ["installer", "-pkg", "{path}", "-target", "/"],
+    '.mpkg': (["sudo"] if USE_SUDO else []) + ["installer", "-pkg", "{path}", "-target", "/"],
+}
+# A bundle whose version is already installed is skipped; set PLUGIN_INSTALL_SKIP_SAME_VERSION=0 to copy it anyway.
+SKIP_SAME_VERSION = os.environ.get('PLUGIN_INSTALL_SKIP_SAME_VERSION', '1') != '0'
+
+inventory = PluginInventory()
 
 def select_folder():
     folder_selected = filedialog.askdirectory()
     folder_path.set(folder_selected)
 
+def select_archive():
+    archive_selected = filedialog.askopenfilename(filetypes=[('Zip archives', '*.zip')])
+    folder_path.set(archive_selected)
+
 def create_folder_structure():
     base_folder = filedialog.askdirectory()
     target_folder = os.path.join(base_folder, "SweejHelperPluginInstaller")
@@ -52,122 +101,246 @@ def create_folder_structure():
     for subfolder in subfolders:
         os.makedirs(os.path.join(target_folder, subfolder), exist_ok=True)
 
-def execute_install():
-    FOLDER_PATH = folder_path.get()
+def build_plan(FOLDER_PATH):
+    # See InstallPlanner.build_plan. Both kinds of copy run in a privileged shell: copy_files streams a folder across
+    # with tar and zip_files runs ZipInstall.py.
+    return planner_build_plan(FOLDER_PATH, DESTINATIONS, INSTALLER_COMMANDS, destination_path, inventory, copy_files,
+                              zip_files, shlex.join, SKIP_SAME_VERSION)
+
+def execute_install(dry_run=False):
+    output.delete(1.0, tk.END)
+    parallel = int(parallel_steps.get())
+
+    def report(text):
+        output.insert(tk.END, text)
+        root.update_idletasks()
+
+    # The inventory is brought up to date first (only folders that changed are read), so downgrades and versions
+    # that are already installed show up in the plan.
+    inventory.scan(plugin_folders())
+    try:
+        planner, missing, staging = build_plan(folder_path.get())
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        report(f"Could not plan the install: {e}\n")
+        return
+    report(planner.dry_run(parallel))
+    if missing:
+        report(f"Nothing to install for {', '.join(missing)}\n")
+    report("\n")
+
+    if not dry_run:
+        if USE_SUDO and planner.steps:
+            # The steps run side by side, so the password is asked for once here rather than by several at once.
+            subprocess.run(["sudo", "-v"])
+        planner.run(parallel, report)
+        inventory.scan(plugin_folders())
+    if staging:
+        shutil.rmtree(staging, ignore_errors=True)
+
+def dry_run_install():
+    execute_install(dry_run=True)
+
+def destination_path(dest):
+    dest = os.path.abspath(os.path.expanduser(dest))
+    return os.path.join(INSTALL_ROOT, dest.lstrip(os.sep)) if INSTALL_ROOT else dest
+
+def privileged(script):
+    cmd = ["/bin/sh", "-c", script]
+    return ["sudo"] + cmd if USE_SUDO else cmd
+
+def list_file(folder, name, paths):
+    # tar -T and xargs read these, relative to the folder they run in; "./" keeps names starting with '-' safe.
+    path = os.path.join(folder, name)
+    with open(path, 'w') as f:
+        f.write(''.join(f"./{item}\n" for item in paths))
+    return shlex.quote(path)
+
+def plugin_folders():
+    return [destination_path(dest) for folder, dest in DESTINATIONS.items() if folder != 'DOCUMENTS']
+
+def show_inventory():
     output.delete(1.0, tk.END)
+    folders = plugin_folders()
+    inventory.scan(folders)
+    output.insert(tk.INSERT, inventory.report(folders))
 
-    message = ""
-    message += copy_files(f"{FOLDER_PATH}/VST", "/Library/Audio/Plug-Ins/VST")
-    message += copy_files(f"{FOLDER_PATH}/VST3", "/Library/Audio/Plug-Ins/VST3")
-    message += copy_files(f"{FOLDER_PATH}/AU", "/Library/Audio/Plug-Ins/Components")
-    message += copy_files(f"{FOLDER_PATH}/AAX", "/Library/Application Support/Avid/Audio/Plug-Ins")
-    message += copy_files(f"{FOLDER_PATH}/DOCUMENTS", "~/Documents")
-
-    installer_folder = f"{FOLDER_PATH}/INSTALLERS"
-
-    for pkg_file in glob.glob(f"{installer_folder}/*.pkg"):
-        try:
-            subprocess.run(["sudo", "installer", "-pkg", pkg_file, "-target", "/"], check=True)
-            message += f"Installed {pkg_file}\n"
-        except subprocess.CalledProcessError as e:
-            print(e)
-            message += f"Failed to install {pkg_file}\n"
-
-    for mpkg_file in glob.glob(f"{installer_folder}/*.mpkg"):
-        try:
-            subprocess.run(["sudo", "installer", "-pkg", mpkg_file, "-target", "/"], check=True)
-            message += f"Installed {mpkg_file}\n"
-        except subprocess.CalledProcessError as e:
-            print(e)
-            message += f"Failed to install {mpkg_file}\n"
-
-    output.insert(tk.INSERT, message)
-
-def copy_files(src, dest):
+def copy_files(src, dest, skip=(), install=None):
     try:
         uid = os.getuid()
         gid = os.getgid()
-        absolute_dest = os.path.abspath(os.path.expanduser(dest))
+        absolute_dest = destination_path(dest)
 
         if not os.path.exists(src):
             return f"Source folder {src} does not exist. Skipping.\n"
 
-        print(f"Copying from {src} to {absolute_dest}")
-
-        mkdir_cmd = ["sudo", "mkdir", "-p", absolute_dest]
-        cp_cmd = ["sudo", "cp", "-Rv", f"{src}/.", absolute_dest]
-
-        if not os.path.exists(dest):
-            subprocess.run(mkdir_cmd, check=True)
-
-        result = subprocess.run(cp_cmd, check=True, capture_output=True, text=True)
-
-        # Loop to run chown and chmod on each file/folder
-        for item in os.listdir(absolute_dest):
-            item_path = os.path.join(absolute_dest, item)
-            chown_cmd = ["sudo", "chown", "-R", f"{uid}:{gid}", item_path]
-            subprocess.run(chown_cmd, check=True)
-
-            if os.path.isdir(item_path):
-                chmod_cmd = ["sudo", "chmod", "755", item_path]
-            else:
-                chmod_cmd = ["sudo", "chmod", "644", item_path]
-            subprocess.run(chmod_cmd, check=True)
+        if not os.listdir(src):
+            return f"Source folder {src} is empty. Skipping.\n"
+
+        # Only files that are new or changed since the manifest of the last install get copied.
+        install = install or InstallPlan(src, absolute_dest, skip)
+        quoted_dest = shlex.quote(absolute_dest)
+        backup = shlex.quote(backup_path(absolute_dest))
+        if not install.changed():
+            if install.stale:
+                install.commit()
+            return f"{src} is already installed in {absolute_dest} ({install.summary()})\n"
+
+        # The manifest and backup are kept in the user's Library and stay the user's: the backup is handed back
+        # after root has filled it, and the manifest is written by the installer itself once the copy is done.
+        os.makedirs(state_dir(absolute_dest), exist_ok=True)
+        with tempfile.TemporaryDirectory() as staging:
+            print(f"Copying from {src} to {absolute_dest}")
+
+            metadata = os.path.join(staging, 'backup')
+            os.makedirs(metadata)
+            install.write_backup_metadata(metadata)
+
+            # Files about to be overwritten or removed are moved aside for rollback, then the changed files are
+            # streamed across with tar, all in one privileged shell. Only the items that were just copied get their
+            # ownership and permissions fixed, not everything already installed in the destination.
+            steps = [
+                f"mkdir -p {quoted_dest}",
+                f"rm -rf {backup}",
+                f"mkdir -p {backup}/files",
+                f"(cd {quoted_dest} && tar -cf - --no-recursion -T {list_file(staging, 'backup.txt', install.replace + install.remove)})"
+                f" | (cd {backup}/files && tar -xpf -)",
+                f"(cd {quoted_dest} && tr '\\n' '\\0' < {list_file(staging, 'remove.txt', install.remove)} | xargs -0 rm -f --)",
+                f"(cd {shlex.quote(src)} && tar -cf - --no-recursion -T {list_file(staging, 'copy.txt', install.folders + [path for path, _ in install.copy])})"
+                f" | (cd {quoted_dest} && tar -xpf -)",
+                f"cp {shlex.quote(metadata)}/* {backup}/",
+                f"chown -R {uid}:{gid} {backup}",
+            ]
+            installed = [shlex.quote(os.path.join(absolute_dest, item)) for item in install.installed_items()]
+            folders = [path for item, path in zip(install.installed_items(), installed)
+                       if os.path.isdir(os.path.join(src, item))]
+            files = [path for item, path in zip(install.installed_items(), installed)
+                     if not os.path.isdir(os.path.join(src, item))]
+            if installed:
+                steps.append(f"chown -R {uid}:{gid} {' '.join(installed)}")
+            if folders:
+                steps.append(f"chmod 755 {' '.join(folders)}")
+            if files:
+                steps.append(f"chmod 644 {' '.join(files)}")
+
+            subprocess.run(privileged(" && ".join(steps)), check=True, capture_output=True, text=True)
+
+        # The manifest goes in last, so an interrupted install is redone next time.
+        install.commit()
+        return f"Installed {src} into {absolute_dest} ({install.summary()})\n"
+    except subprocess.CalledProcessError as e:
+        return str(e) + (f": {e.stderr.strip()}" if e.stderr else "") + "\n"
 
-        return f"Copied files from {src} to {absolute_dest}\n"
+def zip_files(archive, folder, dest, skip=(), install=None):
+    # The extraction has to run as root to write into the plugin folders, so ZipInstall.py runs as a script at the
+    # start of the same privileged shell that then fixes the ownership and permissions of what it installed.
+    try:
+        uid = os.getuid()
+        gid = os.getgid()
+        absolute_dest = destination_path(dest)
+
+        install = install or ZipInstall(archive, folder, absolute_dest, skip)
+        install.close()
+        if not install.exists():
+            return f"{folder} is not in {archive}. Skipping.\n"
+
+        print(f"Extracting {folder} from {archive} to {absolute_dest}")
+
+        # ZipInstall.py is told where the manifests are, as root's home isn't the user's, and its manifest and
+        # backup are handed back to the user afterwards.
+        command = [sys.executable, ZIP_INSTALL_SCRIPT, archive, folder, absolute_dest] + (['--skip'] + list(skip) if skip else [])
+        items = sorted(install.bundles)
+        installed = [shlex.quote(os.path.join(absolute_dest, item)) for item in items]
+        folders = [path for item, path in zip(items, installed) if item not in install.members]
+        files = [path for item, path in zip(items, installed) if item in install.members]
+        os.makedirs(state_dir(absolute_dest), exist_ok=True)
+        steps = [f"PLUGIN_INSTALL_STATE={shlex.quote(STATE_DIR)} " + " ".join(shlex.quote(part) for part in command),
+                 f"chown -R {uid}:{gid} {shlex.quote(state_dir(absolute_dest))}"]
+        if installed:
+            steps.append(f"chown -R {uid}:{gid} {' '.join(installed)}")
+        if folders:
+            steps.append(f"chmod 755 {' '.join(folders)}")
+        if files:
+            steps.append(f"chmod 644 {' '.join(files)}")
+
+        result = subprocess.run(privileged(" && ".join(steps)), check=True, capture_output=True, text=True)
+        return result.stdout
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        return f"Could not install {folder} from {archive}: {e}\n"
+    except subprocess.CalledProcessError as e:
+        return str(e) + (f": {e.stderr.strip()}" if e.stderr else "") + "\n"
+
+def rollback_files(dest):
+    # The same steps as InstallManifest.rollback, as one privileged shell.
+    absolute_dest = destination_path(dest)
+    if not os.path.isdir(backup_path(absolute_dest)):
+        return f"Nothing to roll back in {absolute_dest}\n"
+    backup = shlex.quote(backup_path(absolute_dest))
+    manifest = shlex.quote(manifest_path(absolute_dest))
+    try:
+        steps = [
+            f"cd {shlex.quote(absolute_dest)}",
+            f"tr '\\n' '\\0' < {backup}/added.txt | xargs -0 rm -f --",
+            f"(cd {backup}/files && tar -cf - .) | tar -xpf -",
+            f"if [ -f {backup}/manifest.json ]; then mv {backup}/manifest.json {manifest}; else rm -f {manifest}; fi",
+            f"rm -rf {backup}",
+        ]
+        subprocess.run(privileged(" && ".join(steps)), check=True, capture_output=True, text=True)
+        return f"Rolled back {absolute_dest}\n"
     except subprocess.CalledProcessError as e:
-        return str(e) + "\n"
+        return str(e) + (f": {e.stderr.strip()}" if e.stderr else "") + "\n"
+
+def execute_rollback():
+    output.delete(1.0, tk.END)
+    output.insert(tk.INSERT, "".join(rollback_files(dest) for dest in DESTINATIONS.values()))
 
-    
-    message = ""
-    message += copy_files(f"{FOLDER_PATH}/VST", "/Library/Audio/Plug-Ins/VST")
-    message += copy_files(f"{FOLDER_PATH}/VST3", "/Library/Audio/Plug-Ins/VST3")
-    message += copy_files(f"{FOLDER_PATH}/AU", "/Library/Audio/Plug-Ins/Components")
-    message += copy_files(f"{FOLDER_PATH}/AAX", "/Library/Application Support/Avid/Audio/Plug-Ins")
-    message += copy_files(f"{FOLDER_PATH}/DOCUMENTS", os.path.expanduser("~/Documents"))
+if __name__ == '__main__':
+    # Tk is only needed, and only imported, for the GUI, so copy_files can be used on its own.
+    import tkinter as tk
+    from tkinter import filedialog
+    from tkinter import scrolledtext
 
-    print(f"FOLDER_PATH is set to {FOLDER_PATH}")
+    # Initialize Tkinter
+    root = tk.Tk()
+    root.title('Plugin Installer')
 
-    installer_folder = f"{FOLDER_PATH}/installers"
+    # Folder Path TextBox
+    folder_path = tk.StringVar()
+    entry = tk.Entry(root, textvariable=folder_path, width=50)
+    entry.grid(row=0, column=1)
 
-    for pkg_file in glob.glob(f"{installer_folder}/*.pkg"):
-        try:
-            subprocess.run(["sudo", "installer", "-pkg", pkg_file, "-target", "/"], check=True)
-            message += f"Installed {pkg_file}\n"
-        except subprocess.CalledProcessError as e:
-            message += str(e) + "\n"
+    # Buttons
+    select_button = tk.Button(root, text='Select Folder', command=select_folder)
+    select_button.grid(row=0, column=0)
 
-    for mpkg_file in glob.glob(f"{installer_folder}/*.mpkg"):
-        try:
-            subprocess.run(["sudo", "installer", "-pkg", mpkg_file, "-target", "/"], check=True)
-            message += f"Installed {mpkg_file}\n"
-        except subprocess.CalledProcessError as e:
-            message += str(e) + "\n"
+    select_archive_button = tk.Button(root, text='Select Zip', command=select_archive)
+    select_archive_button.grid(row=0, column=2)
 
-    output.insert(tk.INSERT, message)
+    create_structure_button = tk.Button(root, text='Create Folder Structure', command=create_folder_structure)
+    create_structure_button.grid(row=1, column=0)
 
-# Initialize Tkinter
-root = tk.Tk()
-root.title('Plugin Installer')
+    execute_button = tk.Button(root, text='Execute Install', command=execute_install)
+    execute_button.grid(row=1, column=1)
 
-# Folder Path TextBox
-folder_path = tk.StringVar()
-entry = tk.Entry(root, textvariable=folder_path, width=50)
-entry.grid(row=0, column=1)
+    dry_run_button = tk.Button(root, text='Dry Run', command=dry_run_install)
+    dry_run_button.grid(row=1, column=2)
 
-# Buttons
-select_button = tk.Button(root, text='Select Folder', command=select_folder)
-select_button.grid(row=0, column=0)
+    # How many plan steps run at the same time
+    parallel_steps = tk.StringVar(root)
+    parallel_steps.set(str(INSTALL_PARALLEL))
+    parallel_frame = tk.Frame(root)
+    tk.Label(parallel_frame, text='Parallel Steps').pack(side=tk.LEFT)
+    tk.Spinbox(parallel_frame, from_=1, to=8, textvariable=parallel_steps, width=4).pack(side=tk.LEFT)
+    parallel_frame.grid(row=2, column=2)
 
-create_structure_button = tk.Button(root, text='Create Folder Structure', command=create_folder_structure)
-create_structure_button.grid(row=1, column=0)
+    rollback_button = tk.Button(root, text='Roll Back Last Install', command=execute_rollback)
+    rollback_button.grid(row=2, column=0)
 
-execute_button = tk.Button(root, text='Execute Install', command=execute_install)
-execute_button.grid(row=1, column=1)
+    inventory_button = tk.Button(root, text='Installed Plugins', command=show_inventory)
+    inventory_button.grid(row=2, column=1)
 
-# Output TextBox
-output = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=50, height=10)
-output.grid(row=2, columnspan=2)
+    # Output TextBox
+    output = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=50, height=10)
+    output.grid(row=3, columnspan=2)
 
-# Run Tkinter event loop
-root.mainloop()
+    # Run Tkinter event loop
+    root.mainloop()
@@ -0,0 +1,128 @@
+"""
+Title: Plugin Copy Benchmark
+Samuel Justice
+
+Description:
+
+Compares the original serial copy of WindowsAudioPluginInstaller.py (shutil.copytree / copy2 per top-level item) with
+the parallel copy engine (copy_files: enumerate first, then a thread pool using the OS's own file copy) at different
+worker counts. It writes a synthetic install folder made of plugin bundles (a binary plus many small resource files
+each) and a few large sample files, copies it into a fresh destination for every run and reports the time and MB/s.
+
+The page cache makes repeat runs look faster than a cold install; pass --drop-caches (Linux, as root) to flush it
+before every run, or point --dir at the drive you actually install to.
+
+Usage:
+
+```bash
+python PluginCopyBenchmark.py --bundles 40 --samples 4 --sample-mb 512 --workers 2 4 8 16
+python PluginCopyBenchmark.py --dir /Volumes/Scratch --repeat 3 --drop-caches
+```
+"""
+
+import io
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+
+from WindowsAudioPluginInstaller import copy_files
+
+
+def legacy_copy_files(src, dest):
+    # The serial copy from before the copy engine, kept here as the baseline.
+    os.makedirs(dest, exist_ok=True)
+    for item in os.listdir(src):
+        src_path = os.path.join(src, item)
+        dest_path = os.path.join(dest, item)
+        if os.path.isdir(src_path):
+            shutil.copytree(src_path, dest_path, dirs_exist_ok=True)
+        else:
+            shutil.copy2(src_path, dest_path)
+
+
+def write_file(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    block = os.urandom(min(size, 1024 * 1024))
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            f.write(block[:size - written])
+            written += len(block[:size - written])
+
+
+def write_install_folder(root, bundles, binary_mb, resources, samples, sample_mb):
+    for bundle in range(bundles):
+        contents = os.path.join(root, f"Plugin {bundle:03d}.vst3", 'Contents')
+        write_file(os.path.join(contents, 'x86_64-win', f"Plugin {bundle:03d}.vst3"), int(binary_mb * 1024 * 1024))
+        for resource in range(resources):
+            write_file(os.path.join(contents, 'Resources', f"preset_{resource:03d}.vstpreset"), 4096)
+    for sample in range(samples):
+        write_file(os.path.join(root, 'Library', f"samples_{sample:02d}.dat"), sample_mb * 1024 * 1024)
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(root) for name in names)
+
+
+def drop_caches():
+    os.sync()
+    try:
+        with open('/proc/sys/vm/drop_caches', 'w') as f:
+            f.write('3\n')
+    except OSError as e:
+        print(f"Could not drop the page cache: {e}")
+
+
+def timed_copy(label, copy, source, work_dir, size, args):
+    best = None
+    for _ in range(args.repeat):
+        dest = tempfile.mkdtemp(dir=work_dir)
+        if args.drop_caches:
+            drop_caches()
+        start = time.perf_counter()
+        copy(source, dest)
+        elapsed = time.perf_counter() - start
+        shutil.rmtree(dest)
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<20} {best:>8.2f}s {size / best / 1e6:>9.1f} MB/s")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serial vs parallel plugin copy')
+    parser.add_argument('--dir', help='Where to write the synthetic folder and the copies (defaults to a temp dir)')
+    parser.add_argument('--bundles', type=int, default=40, help='Plugin bundles in the install folder')
+    parser.add_argument('--binary-mb', type=float, default=20, help='Size of each bundle binary')
+    parser.add_argument('--resources', type=int, default=50, help='Small resource files per bundle')
+    parser.add_argument('--samples', type=int, default=4, help='Large sample files in the install folder')
+    parser.add_argument('--sample-mb', type=int, default=256, help='Size of each sample file')
+    parser.add_argument('--workers', type=int, nargs='+', default=[2, 4, 8, 16])
+    parser.add_argument('--repeat', type=int, default=2, help='Runs per copy; the best is reported')
+    parser.add_argument('--drop-caches', action='store_true', help='Flush the Linux page cache before each run')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        source = os.path.join(work_dir, 'source')
+        size = write_install_folder(source, args.bundles, args.binary_mb, args.resources, args.samples, args.sample_mb)
+        files = sum(len(names) for _, _, names in os.walk(source))
+        print(f"{files} files, {size / 1e9:.2f} GB in {source}")
+
+        serial = timed_copy('serial copytree', legacy_copy_files, source, work_dir, size, args)
+        for workers in args.workers:
+            # copy_files reports failures in its message instead of raising, so they are checked for here.
+            def parallel(src, dest, workers=workers):
+                with redirect_stdout(io.StringIO()):
+                    message = copy_files(src, dest, workers=workers, differential=False)
+                if not message.startswith('Copied'):
+                    sys.exit(f"Copy failed: {message}")
+            elapsed = timed_copy(f"parallel x{workers}", parallel, source, work_dir, size, args)
+            print(f"{'':<20} {serial / elapsed:>8.2f}x the serial copy")
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+# Plugin Inventory
+#
+# Description:
+# A SQLite inventory of the plugin bundles installed on a machine: name, format, version, size and modification time
+# of every VST, VST3, AU and AAX bundle in the plugin folders. The version comes from the bundle's Info.plist, or from
+# the moduleinfo.json that newer VST3 bundles carry.
+#
+# Rescans are incremental. A folder whose modification time hasn't changed since the last scan isn't listed again,
+# its bundles and subfolders come from the database, and a known bundle is only re-read when the modification time of
+# the bundle or of its metadata file changed. On a studio machine with thousands of plugins a rescan is one stat per
+# folder and two per bundle, rather than opening every bundle.
+#
+# The installers scan their destinations before an install and use check_install() to warn about downgrades and to
+# skip bundles whose version is already installed.
+#
+# Author: Samuel Justice
+#
+# Functions:
+# - PluginInventory.scan(folders): Brings the inventory of 'folders' up to date.
+# - PluginInventory.lookup(path): The inventory entry of the bundle at 'path', if there is one.
+# - PluginInventory.check_install(src, dest): The bundles in 'src' to skip, and warnings about them.
+# - PluginInventory.check_versions(versions, dest): The same for bundles that aren't in a folder, such as in a zip.
+# - PluginInventory.report(): The inventory as a table.
+#
+# Usage:
+# python PluginInventory.py [plugin folders...]  (defaults to the system plugin folders)
+
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import plistlib
+
+INVENTORY_DB = os.environ.get('PLUGIN_INVENTORY_DB', os.path.expanduser('~/.plugininstaller/inventory.sqlite3'))
+FORMATS = {
+    '.vst': 'VST',
+    '.dll': 'VST',  # VST 2 plugins on Windows are plain DLLs
+    '.vst3': 'VST3',
+    '.component': 'AU',
+    '.aaxplugin': 'AAX',
+}
+METADATA_FILES = [os.path.join('Contents', 'Info.plist'), os.path.join('Contents', 'Resources', 'moduleinfo.json')]
+
+if sys.platform == 'win32':
+    DEFAULT_FOLDERS = ['C:/Program Files/VSTPlugins', 'C:/Program Files/Common Files/VST3',
+                       'C:/Program Files/Common Files/Avid/Audio/Plug-Ins']
+else:
+    DEFAULT_FOLDERS = [os.path.join(library, 'Audio', 'Plug-Ins', folder)
+                       for library in ['/Library', os.path.expanduser('~/Library')]
+                       for folder in ['VST', 'VST3', 'Components']] + ['/Library/Application Support/Avid/Audio/Plug-Ins']
+
+
+def bundle_format(name):
+    return FORMATS.get(os.path.splitext(name)[1].lower())
+
+
+def bundle_stamp(path):
+    # (bundle mtime, metadata mtime) - what decides whether a known bundle has to be read again.
+    mtime = os.stat(path).st_mtime_ns
+    for metadata in METADATA_FILES:
+        try:
+            return mtime, os.stat(os.path.join(path, metadata)).st_mtime_ns
+        except OSError:
+            pass
+    return mtime, None
+
+
+def version_key(version):
+    # Trailing zeros are dropped, so 1.2 and 1.2.0 compare as the same version.
+    key = [int(part) for part in re.findall(r'\d+', version or '')]
+    while key and key[-1] == 0:
+        key.pop()
+    return key
+
+
+def parse_info_plist(data):
+    try:
+        info = plistlib.loads(data)
+    except (ValueError, plistlib.InvalidFileException):
+        return None, None
+    return info.get('CFBundleName'), info.get('CFBundleShortVersionString') or info.get('CFBundleVersion')
+
+
+def parse_moduleinfo(text):
+    # moduleinfo.json is allowed to be JSON5, so when it doesn't parse as JSON the two fields are picked out with a regex.
+    try:
+        info = json.loads(text)
+        return info.get('Name'), info.get('Version')
+    except ValueError:
+        fields = dict(re.findall(r'"(Name|Version)"\s*:\s*"([^"]*)"', text))
+        return fields.get('Name'), fields.get('Version')
+
+
+def read_metadata(path):
+    # Name and version from Info.plist, or moduleinfo.json.
+    try:
+        with open(os.path.join(path, METADATA_FILES[0]), 'rb') as f:
+            name, version = parse_info_plist(f.read())
+        if version:
+            return name, version
+    except OSError:
+        pass
+    try:
+        with open(os.path.join(path, METADATA_FILES[1]), encoding='utf-8', errors='replace') as f:
+            return parse_moduleinfo(f.read())
+    except OSError:
+        return None, None
+
+
+def read_bundle(path, with_size=True):
+    name, version = read_metadata(path) if os.path.isdir(path) else (None, None)
+    size = 0
+    if with_size:
+        if os.path.isdir(path):
+            size = sum(os.path.getsize(os.path.join(dirpath, filename))
+                       for dirpath, _, filenames in os.walk(path) for filename in filenames)
+        else:
+            size = os.path.getsize(path)
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    return name, bundle_format(path), version, size
+
+
+class PluginInventory:
+    COLUMNS = ('path', 'folder', 'name', 'format', 'version', 'size', 'mtime_ns', 'metadata_mtime_ns', 'scanned_at')
+
+    def __init__(self, path=None):
+        self.path = path or INVENTORY_DB
+        self.folders_read = 0
+        self.bundles_read = 0
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute('CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER)')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS bundles (path TEXT PRIMARY KEY, folder TEXT, name TEXT, format TEXT, '
+            'version TEXT, size INTEGER, mtime_ns INTEGER, metadata_mtime_ns INTEGER, scanned_at TEXT)')
+        connection.execute('CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent)')
+        connection.execute('CREATE INDEX IF NOT EXISTS bundles_folder ON bundles (folder)')
+        return connection
+
+    def scan(self, folders):
+        self.folders_read = 0
+        self.bundles_read = 0
+        with self.connect() as connection:
+            for folder in folders:
+                self.scan_folder(connection, os.path.abspath(folder), None)
+        connection.close()
+        return self.folders_read, self.bundles_read
+
+    def forget(self, connection, folder):
+        # Drops a folder that is gone, with everything that was found under it.
+        prefix = folder + os.sep
+        connection.execute('DELETE FROM folders WHERE path = ? OR substr(path, 1, ?) = ?', (folder, len(prefix), prefix))
+        connection.execute('DELETE FROM bundles WHERE folder = ? OR substr(folder, 1, ?) = ?',
+                           (folder, len(prefix), prefix))
+
+    def scan_folder(self, connection, folder, parent):
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            self.forget(connection, folder)
+            return
+        known = {row[0]: row[1:] for row in connection.execute(
+            'SELECT path, mtime_ns, metadata_mtime_ns FROM bundles WHERE folder = ?', (folder,))}
+        row = connection.execute('SELECT mtime_ns FROM folders WHERE path = ?', (folder,)).fetchone()
+
+        if row and row[0] == mtime:
+            # Nothing was added or removed here since the last scan, so the folder isn't listed again.
+            bundles = list(known)
+            subfolders = [path for path, in connection.execute('SELECT path FROM folders WHERE parent = ?', (folder,))]
+        else:
+            self.folders_read += 1
+            bundles = []
+            subfolders = []
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue  # Hidden files
+                    if bundle_format(entry.name):
+                        bundles.append(entry.path)
+                    elif entry.is_dir():
+                        subfolders.append(entry.path)
+            for path in set(known) - set(bundles):
+                connection.execute('DELETE FROM bundles WHERE path = ?', (path,))
+            for path, in connection.execute('SELECT path FROM folders WHERE parent = ?', (folder,)).fetchall():
+                if path not in subfolders:
+                    self.forget(connection, path)
+            connection.execute('INSERT OR REPLACE INTO folders (path, parent, mtime_ns) VALUES (?, ?, ?)',
+                               (folder, parent, mtime))
+
+        for path in bundles:
+            try:
+                stamp = bundle_stamp(path)
+            except OSError:
+                connection.execute('DELETE FROM bundles WHERE path = ?', (path,))
+                continue
+            if known.get(path) == stamp:
+                continue
+            self.bundles_read += 1
+            row = (path, folder) + read_bundle(path) + stamp + (time.strftime('%Y-%m-%d %H:%M:%S'),)
+            connection.execute(f"INSERT OR REPLACE INTO bundles ({', '.join(self.COLUMNS)}) "
+                               f"VALUES ({', '.join('?' * len(row))})", row)
+
+        for subfolder in subfolders:
+            self.scan_folder(connection, subfolder, folder)
+
+    def lookup(self, path):
+        with self.connect() as connection:
+            row = connection.execute('SELECT name, format, version, size, mtime_ns FROM bundles WHERE path = ?',
+                                     (os.path.abspath(path),)).fetchone()
+        connection.close()
+        return row
+
+    def bundles(self, folders=None):
+        with self.connect() as connection:
+            rows = connection.execute('SELECT path, name, format, version, size FROM bundles ORDER BY format, name').fetchall()
+        connection.close()
+        if folders:
+            prefixes = tuple(os.path.abspath(folder) + os.sep for folder in folders)
+            rows = [row for row in rows if row[0].startswith(prefixes)]
+        return rows
+
+    def check_install(self, src, dest, skip_same_version=True):
+        if not os.path.isdir(src):
+            return [], ''
+        versions = {item: read_bundle(os.path.join(src, item), with_size=False)[2]
+                    for item in sorted(os.listdir(src)) if bundle_format(item)}
+        return self.check_versions(versions, dest, skip_same_version)
+
+    def check_versions(self, versions, dest, skip_same_version=True):
+        # Compares the bundles about to be installed ({item: version}) with what the inventory has at the same place
+        # in 'dest'. Downgrades go ahead with a warning; bundles whose version is already installed can be skipped.
+        skip = []
+        notes = ''
+        for item, version in versions.items():
+            installed = self.lookup(os.path.join(dest, item))
+            if not installed or not installed[2] or not version:
+                continue
+            if version_key(version) < version_key(installed[2]):
+                notes += f"Warning: {item} {installed[2]} is installed, this install downgrades it to {version}\n"
+            elif version_key(version) == version_key(installed[2]) and skip_same_version:
+                skip.append(item)
+                notes += f"Skipping {item}: version {version} is already installed\n"
+        return skip, notes
+
+    def report(self, folders=None):
+        lines = [f"{'format':<6} {'version':<14} {'MB':>8}  name"]
+        rows = self.bundles(folders)
+        for path, name, format, version, size in rows:
+            lines.append(f"{format:<6} {version or '?':<14} {size / 1e6:>8.1f}  {name}")
+        lines.append(f"{len(rows)} plugins")
+        return '\n'.join(lines) + '\n'
+
+
+if __name__ == '__main__':
+    folders = sys.argv[1:] or DEFAULT_FOLDERS
+    inventory = PluginInventory()
+    start = time.perf_counter()
+    folders_read, bundles_read = inventory.scan(folders)
+    print(inventory.report(folders), end='')
+    print(f"Scanned in {time.perf_counter() - start:.2f}s: listed {folders_read} folders, read {bundles_read} bundles")
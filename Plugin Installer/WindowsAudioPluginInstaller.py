@@ -1,15 +1,87 @@
-import tkinter as tk
-from tkinter import filedialog
-from tkinter import scrolledtext
 import shutil
-import glob
 import subprocess
 import os
+import sys
+import time
+import queue
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from InstallManifest import InstallPlan, remove_link, rollback
+from PluginInventory import PluginInventory
+from ZipInstall import install_from_zip
+from InstallPlanner import INSTALL_PARALLEL, build_plan as planner_build_plan
+
+# Files are copied by a thread pool; copying is I/O bound, so the threads overlap reads and writes across files.
+COPY_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+COPY_CHUNK_SIZE = 64 * 1024 * 1024  # Progress granularity for big sample files on Linux
+PROGRESS_INTERVAL_MS = 200
+
+# Setting PLUGIN_INSTALL_ROOT puts every destination under that directory (C:/Program Files/... becomes
+# <root>/C/Program Files/...), so installs can be tested and benchmarked in a temp folder, on Linux too.
+INSTALL_ROOT = os.environ.get('PLUGIN_INSTALL_ROOT', '')
+DESTINATIONS = {
+    # Update these paths according to the specific requirements of the plugins
+    'VST': 'C:/Program Files/VSTPlugins',
+    'VST3': 'C:/Program Files/Common Files/VST3',
+    'AAX': 'C:/Program Files/Common Files/Avid/Audio/Plug-Ins',
+    'DOCUMENTS': '~/Documents',  # Copying documents
+}
+# How each kind of package in INSTALLERS is installed; PLUGIN_INSTALLER_COMMAND replaces these (see InstallPlanner.py).
+INSTALLER_COMMANDS = {
+    '.exe': ['{path}'],
+    '.msi': ['msiexec', '/i', '{path}'],
+}
+# A bundle whose version is already installed is skipped; set PLUGIN_INSTALL_SKIP_SAME_VERSION=0 to copy it anyway.
+SKIP_SAME_VERSION = os.environ.get('PLUGIN_INSTALL_SKIP_SAME_VERSION', '1') != '0'
+
+inventory = PluginInventory()
+
+messages = queue.Queue()  # Lines for the output box, written by the install thread
+
+
+class CopyProgress:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total_bytes = 0
+        self.done_bytes = 0
+        self.total_files = 0
+        self.done_files = 0
+        self.start = time.monotonic()
+
+    def add_total(self, files, size):
+        with self.lock:
+            self.total_files += files
+            self.total_bytes += size
+
+    def advance(self, size, files=0):
+        with self.lock:
+            self.done_bytes += size
+            self.done_files += files
+
+    def summary(self):
+        with self.lock:
+            done, total, files, total_files = self.done_bytes, self.total_bytes, self.done_files, self.total_files
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        rate = done / elapsed
+        eta = (total - done) / rate if rate else 0
+        return (f"{files}/{total_files} files, {done / 1e9:.2f}/{total / 1e9:.2f} GB, {rate / 1e6:.1f} MB/s, "
+                f"ETA {time.strftime('%H:%M:%S', time.gmtime(eta))}")
+
+
+def destination_path(dest):
+    dest = os.path.expanduser(dest)
+    return os.path.join(INSTALL_ROOT, dest.replace(':', '').lstrip('/\\')) if INSTALL_ROOT else dest
 
 def select_folder():
     folder_selected = filedialog.askdirectory()
     folder_path.set(folder_selected)
 
+def select_archive():
+    archive_selected = filedialog.askopenfilename(filetypes=[('Zip archives', '*.zip')])
+    folder_path.set(archive_selected)
+
 def create_folder_structure():
     base_folder = filedialog.askdirectory()
     target_folder = os.path.join(base_folder, "SweejHelperPluginInstaller")
@@ -19,81 +91,257 @@ def create_folder_structure():
     for subfolder in subfolders:
         os.makedirs(os.path.join(target_folder, subfolder), exist_ok=True)
 
-def execute_install():
-    FOLDER_PATH = folder_path.get()
+def execute_install(dry_run=False):
+    # The install runs on its own thread; poll_install keeps the window responsive and shows the progress.
+    global install_thread, progress
+    if install_thread and install_thread.is_alive():
+        return
     output.delete(1.0, tk.END)
+    progress = CopyProgress()
+    install_thread = threading.Thread(target=run_install,
+                                      args=(folder_path.get(), progress, int(parallel_steps.get()), dry_run), daemon=True)
+    install_thread.start()
+    execute_button.configure(state='disabled')
+    root.after(PROGRESS_INTERVAL_MS, poll_install)
 
-    message = ""
-    # Update these paths according to the specific requirements of the plugins
-    message += copy_files(f"{FOLDER_PATH}/VST", "C:/Program Files/VSTPlugins")
-    message += copy_files(f"{FOLDER_PATH}/VST3", "C:/Program Files/Common Files/VST3")
-    message += copy_files(f"{FOLDER_PATH}/AAX", "C:/Program Files/Common Files/Avid/Audio/Plug-Ins")
-    message += copy_files(f"{FOLDER_PATH}/DOCUMENTS", os.path.expanduser("~/Documents"))  # Copying documents
+def dry_run_install():
+    execute_install(dry_run=True)
 
-    installer_folder = f"{FOLDER_PATH}/INSTALLERS"
+def poll_install():
+    while not messages.empty():
+        output.insert(tk.END, messages.get_nowait())
+    progress_text.set(progress.summary())
+    if install_thread.is_alive() or not messages.empty():
+        root.after(PROGRESS_INTERVAL_MS, poll_install)
+    else:
+        execute_button.configure(state='normal')
 
-    # Handling .exe files
-    for exe_file in glob.glob(f"{installer_folder}/*.exe"):
+def execute_rollback():
+    if install_thread and install_thread.is_alive():
+        return
+    output.delete(1.0, tk.END)
+    for dest in DESTINATIONS.values():
         try:
-            subprocess.run([exe_file], check=True)
-            message += f"Installed {exe_file}\n"
-        except subprocess.CalledProcessError as e:
-            message += f"Failed to install {exe_file}\n"
+            output.insert(tk.END, rollback(destination_path(dest)))
+        except OSError as e:
+            output.insert(tk.END, f"Could not roll back {dest}: {e}\n")
 
-    # Handling .msi files
-    for msi_file in glob.glob(f"{installer_folder}/*.msi"):
-        try:
-            subprocess.run(["msiexec", "/i", msi_file], check=True)
-            message += f"Installed {msi_file}\n"
-        except subprocess.CalledProcessError as e:
-            message += f"Failed to install {msi_file}\n"
+def build_plan(FOLDER_PATH, progress):
+    # See InstallPlanner.build_plan. Folders are copied by the thread pool in copy_files and zip members are streamed
+    # straight to their destination by install_from_zip, both counting towards the one progress bar.
+    return planner_build_plan(FOLDER_PATH, DESTINATIONS, INSTALLER_COMMANDS, destination_path, inventory,
+                              lambda src, dest, skip, install:
+                              copy_files(src, dest, progress, plan_copy(src, destination_path(dest), install=install)),
+                              lambda archive, folder, dest, skip, install:
+                              install_from_zip(archive, folder, destination_path(dest), plan=install),
+                              subprocess.list2cmdline, SKIP_SAME_VERSION, progress)
+
+def run_install(FOLDER_PATH, progress, parallel=None, dry_run=False):
+    # The inventory is brought up to date first (only folders that changed are read), so downgrades and versions
+    # that are already installed show up in the plan.
+    inventory.scan(plugin_folders())
+    try:
+        planner, missing, staging = build_plan(FOLDER_PATH, progress)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        messages.put(f"Could not plan the install: {e}\n")
+        return
+    messages.put(planner.dry_run(parallel))
+    if missing:
+        messages.put(f"Nothing to install for {', '.join(missing)}\n")
+    messages.put("\n")
 
-    output.insert(tk.INSERT, message)
+    if not dry_run:
+        planner.run(parallel, messages.put)
+        inventory.scan(plugin_folders())
+    if staging:
+        shutil.rmtree(staging, ignore_errors=True)
 
-def copy_files(src, dest):
+def plugin_folders():
+    return [destination_path(dest) for folder, dest in DESTINATIONS.items() if folder != 'DOCUMENTS']
+
+def show_inventory():
+    if install_thread and install_thread.is_alive():
+        return
+    output.delete(1.0, tk.END)
+    folders = plugin_folders()
+    inventory.scan(folders)
+    output.insert(tk.END, inventory.report(folders))
+
+def plan_copy(src, dest, differential=True, skip=(), install=None):
+    # Every folder to create and every (source, destination, size) file to copy, biggest files first so a
+    # huge sample file doesn't start last and leave the other workers idle. A differential plan only has
+    # the files the destination's manifest says are new or changed, from 'install' if it has been planned already.
+    if not os.path.exists(src):
+        return None
+    if differential:
+        install = install or InstallPlan(src, dest, skip)
+        folders = [dest] + [os.path.join(dest, folder) for folder in install.folders]
+        files = [(os.path.join(src, path), os.path.join(dest, path), size) for path, size in install.copy]
+    else:
+        install = None
+        folders = [dest]
+        files = []
+        for dirpath, dirnames, filenames in os.walk(src):
+            relative = os.path.relpath(dirpath, src)
+            target = dest if relative == '.' else os.path.join(dest, relative)
+            # Symlinks, to folders too, are copied as links like files, and not followed.
+            links = [name for name in dirnames if os.path.islink(os.path.join(dirpath, name))]
+            folders.extend(os.path.join(target, dirname) for dirname in dirnames if dirname not in links)
+            for filename in filenames + links:
+                source = os.path.join(dirpath, filename)
+                size = 0 if os.path.islink(source) else os.path.getsize(source)
+                files.append((source, os.path.join(target, filename), size))
+    files.sort(key=lambda file: file[2], reverse=True)
+    return folders, files, install
+
+def copy_file(src, dest, progress):
+    # The copy is left to the OS where it can do it in the kernel: CopyFileExW on Windows,
+    # sendfile on Linux and fcopyfile (through shutil) on macOS.
+    if os.path.islink(src):
+        copy_link(src, dest)
+        progress.advance(0, files=1)
+        return
+    if sys.platform == 'win32':
+        windows_copy_file(src, dest, progress)
+    elif sys.platform.startswith('linux'):
+        linux_copy_file(src, dest, progress)
+    else:
+        shutil.copyfile(src, dest)
+        progress.advance(os.path.getsize(dest))
+    shutil.copystat(src, dest)
+    progress.advance(0, files=1)
+
+def copy_link(src, dest):
+    # Bundles with frameworks carry symlinks (Versions/Current -> A), which are recreated as links rather than
+    # copied as the files or folders they point to.
+    if os.path.lexists(dest):
+        remove_link(dest)
+    os.symlink(os.readlink(src), dest, target_is_directory=os.path.isdir(src))
+
+def linux_copy_file(src, dest, progress):
+    with open(src, 'rb') as fsrc, open(dest, 'wb') as fdest:
+        offset = 0
+        while True:
+            try:
+                sent = os.sendfile(fdest.fileno(), fsrc.fileno(), offset, COPY_CHUNK_SIZE)
+            except OSError:
+                if offset:
+                    raise
+                # Some filesystems don't support sendfile between files; copy through userspace instead.
+                shutil.copyfileobj(fsrc, fdest, COPY_CHUNK_SIZE)
+                progress.advance(fdest.tell())
+                return
+            if not sent:
+                break
+            offset += sent
+            progress.advance(sent)
+
+def windows_copy_file(src, dest, progress):
+    import ctypes
+    from ctypes import wintypes
+    copied = [0]
+
+    # Called by CopyFileExW as the copy goes, which gives progress within big files too.
+    @ctypes.WINFUNCTYPE(wintypes.DWORD, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_longlong, ctypes.c_longlong,
+                        wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE, wintypes.HANDLE, wintypes.LPVOID)
+    def on_progress(total, transferred, stream_size, stream_transferred, stream, reason, source, target, data):
+        progress.advance(transferred - copied[0])
+        copied[0] = transferred
+        return 0  # PROGRESS_CONTINUE
+
+    if not ctypes.windll.kernel32.CopyFileExW(src, dest, on_progress, None, None, 0):
+        raise ctypes.WinError()
+
+def copy_files(src, dest, progress=None, plan=None, workers=None, differential=True):
     try:
-        if not os.path.exists(src):
+        absolute_dest = destination_path(dest)
+        plan = plan or plan_copy(src, absolute_dest, differential)
+        if plan is None:
             return f"Source folder {src} does not exist. Skipping.\n"
 
-        print(f"Copying from {src} to {dest}")
+        folders, files, install = plan
+        if install and not install.changed():
+            if install.stale:
+                install.commit()
+            return f"{src} is already installed in {absolute_dest} ({install.summary()})\n"
 
-        if not os.path.exists(dest):
-            os.makedirs(dest, exist_ok=True)
+        print(f"Copying from {src} to {absolute_dest}")
 
-        for item in os.listdir(src):
-            src_path = os.path.join(src, item)
-            dest_path = os.path.join(dest, item)
-            if os.path.isdir(src_path):
-                shutil.copytree(src_path, dest_path, dirs_exist_ok=True)
-            else:
-                shutil.copy2(src_path, dest_path)
+        if progress is None:
+            progress = CopyProgress()
+            progress.add_total(len(files), sum(size for _, _, size in files))
+        for folder in folders:
+            os.makedirs(folder, exist_ok=True)
+        if install:
+            install.backup()
 
-        return f"Copied files from {src} to {dest}\n"
+        with ThreadPoolExecutor(max_workers=workers or COPY_WORKERS) as pool:
+            list(pool.map(lambda file: copy_file(file[0], file[1], progress), files))
+
+        # The manifest is only written once everything is in place, so an interrupted install is redone next time.
+        if install:
+            install.commit()
+            return f"Installed {src} into {absolute_dest} ({install.summary()})\n"
+        return f"Copied {len(files)} files from {src} to {absolute_dest}\n"
     except Exception as e:
         return str(e) + "\n"
 
-# Initialize Tkinter
-root = tk.Tk()
-root.title('Plugin Installer')
+if __name__ == '__main__':
+    # Tk is only needed, and only imported, for the GUI, so copy_files can be used and benchmarked on its own.
+    import tkinter as tk
+    from tkinter import filedialog
+    from tkinter import scrolledtext
+
+    install_thread = None
+    progress = CopyProgress()
+
+    # Initialize Tkinter
+    root = tk.Tk()
+    root.title('Plugin Installer')
+
+    # Folder Path TextBox
+    folder_path = tk.StringVar()
+    entry = tk.Entry(root, textvariable=folder_path, width=50)
+    entry.grid(row=0, column=1)
+
+    # Buttons
+    select_button = tk.Button(root, text='Select Folder', command=select_folder)
+    select_button.grid(row=0, column=0)
+
+    select_archive_button = tk.Button(root, text='Select Zip', command=select_archive)
+    select_archive_button.grid(row=0, column=2)
+
+    create_structure_button = tk.Button(root, text='Create Folder Structure', command=create_folder_structure)
+    create_structure_button.grid(row=1, column=0)
+
+    execute_button = tk.Button(root, text='Execute Install', command=execute_install)
+    execute_button.grid(row=1, column=1)
+
+    dry_run_button = tk.Button(root, text='Dry Run', command=dry_run_install)
+    dry_run_button.grid(row=1, column=2)
 
-# Folder Path TextBox
-folder_path = tk.StringVar()
-entry = tk.Entry(root, textvariable=folder_path, width=50)
-entry.grid(row=0, column=1)
+    # How many plan steps run at the same time
+    parallel_steps = tk.StringVar(root)
+    parallel_steps.set(str(INSTALL_PARALLEL))
+    parallel_frame = tk.Frame(root)
+    tk.Label(parallel_frame, text='Parallel Steps').pack(side=tk.LEFT)
+    tk.Spinbox(parallel_frame, from_=1, to=8, textvariable=parallel_steps, width=4).pack(side=tk.LEFT)
+    parallel_frame.grid(row=2, column=2)
 
-# Buttons
-select_button = tk.Button(root, text='Select Folder', command=select_folder)
-select_button.grid(row=0, column=0)
+    rollback_button = tk.Button(root, text='Roll Back Last Install', command=execute_rollback)
+    rollback_button.grid(row=2, column=0)
 
-create_structure_button = tk.Button(root, text='Create Folder Structure', command=create_folder_structure)
-create_structure_button.grid(row=1, column=0)
+    inventory_button = tk.Button(root, text='Installed Plugins', command=show_inventory)
+    inventory_button.grid(row=2, column=1)
 
-execute_button = tk.Button(root, text='Execute Install', command=execute_install)
-execute_button.grid(row=1, column=1)
+    # Copy progress: bytes, speed and time left
+    progress_text = tk.StringVar(root)
+    progress_label = tk.Label(root, textvariable=progress_text)
+    progress_label.grid(row=3, columnspan=2)
 
-# Output TextBox
-output = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=50, height=10)
-output.grid(row=2, columnspan=2)
+    # Output TextBox
+    output = scrolledtext.ScrolledText(root, wrap=tk.WORD, width=50, height=10)
+    output.grid(row=4, columnspan=2)
 
-# Run Tkinter event loop
-root.mainloop()
+    # Run Tkinter event loop
+    root.mainloop()
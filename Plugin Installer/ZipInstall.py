@@ -0,0 +1,323 @@
+# Zip Install
+#
+# Description:
+# Installs straight from a zip archive laid out like the folder structure the installers create (AAX, AU, VST, VST3,
+# DOCUMENTS and INSTALLERS at the top), without unpacking it to a staging folder first. Each member is decompressed
+# and written to its final destination in one pass, several members at a time, and zipfile checks every member's
+# CRC-32 as the last block is read. A member is written next to its destination under a temporary name and only
+# renamed into place once its CRC has checked out, so a corrupt archive never leaves a half-written plugin behind.
+# Nothing is ever written outside the destination: member paths with '..' or absolute symlinks are refused, and so is
+# a symlink that points outside it or a member whose folder is reached through such a link.
+#
+# Zip installs are differential in the same way as folder installs (see InstallManifest.py): a destination file whose
+# size and CRC-32 match the member is left alone, and isn't even read when its size and time still match the manifest.
+# Files dropped from a bundle are removed, the files and symlinks that get replaced or removed are moved into the
+# backup folder first, and the manifest is updated afterwards, so the last install can be rolled back whether it came
+# from a folder or a zip.
+#
+# Author: Samuel Justice
+#
+# Functions:
+# - ZipInstall(archive, folder, dest, skip): Installs the members under 'folder/' in 'archive' into 'dest'.
+# - ZipInstall.plan() / ZipInstall.install(): Works out what changed, then extracts it.
+# - archive_versions(archive, folder): The version of each plugin bundle under 'folder/', read from the archive.
+# - extract_folder(archive, folder, target): Extracts everything under 'folder/' into 'target', e.g. the INSTALLERS.
+#
+# Usage:
+# python ZipInstall.py archive.zip VST3 "/Library/Audio/Plug-Ins/VST3" [--skip Plugin.vst3] [--workers 8]
+# (how the macOS installer runs it under sudo)
+
+import os
+import sys
+import time
+import stat
+import zlib
+import zipfile
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from InstallManifest import InstallPlan, HASH_BLOCK_SIZE, link_entry, load_manifest, manifest_files
+from PluginInventory import bundle_format, parse_info_plist, parse_moduleinfo
+
+EXTRACT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+EXTRACT_CHUNK_SIZE = 1024 * 1024
+PARTIAL_SUFFIX = '.partial'
+
+
+def member_path(info, folder):
+    # The member's path relative to 'folder', as a list of parts, or None if it isn't under it. Paths that would
+    # land outside the destination are refused rather than skipped.
+    prefix = folder + '/'
+    if not info.filename.startswith(prefix) or info.filename == prefix:
+        return None
+    parts = info.filename[len(prefix):].rstrip('/').split('/')
+    if any(part in ('', '.', '..') or ':' in part or '\\' in part for part in parts):
+        raise ValueError(f"Unsafe path in {info.filename}")
+    return parts
+
+
+def contained(path, dest):
+    # Whether 'path' is inside 'dest' once every symlink on the way to it is followed.
+    root = os.path.realpath(dest)
+    return os.path.commonpath([root, os.path.realpath(path)]) == root
+
+
+def member_mtime_ns(info):
+    return int(time.mktime(info.date_time + (0, 0, -1))) * 1000000000
+
+
+def is_symlink(info):
+    return stat.S_ISLNK(info.external_attr >> 16)
+
+
+def file_crc(path):
+    crc = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            crc = zlib.crc32(block, crc)
+    return crc
+
+
+def manifest_entry(info):
+    # The archive already has a CRC-32 of every member, so that goes into the manifest rather than a SHA-256 that
+    # would cost a second pass over the data. A folder install later sees a digest it can't match and copies the file.
+    return [info.file_size, member_mtime_ns(info), f"crc32:{info.CRC:08x}"]
+
+
+def archive_versions(archive, folder):
+    versions = {}
+    with zipfile.ZipFile(archive) as zf:
+        names = set(zf.namelist())
+        items = {parts[0] for parts in (member_path(info, folder) for info in zf.infolist()) if parts}
+        for item in sorted(items):
+            if not bundle_format(item):
+                continue
+            version = None
+            plist = f"{folder}/{item}/Contents/Info.plist"
+            moduleinfo = f"{folder}/{item}/Contents/Resources/moduleinfo.json"
+            if plist in names:
+                version = parse_info_plist(zf.read(plist))[1]
+            if not version and moduleinfo in names:
+                version = parse_moduleinfo(zf.read(moduleinfo).decode('utf-8', 'replace'))[1]
+            versions[item] = version
+    return versions
+
+
+def extract_folder(archive, folder, target):
+    install = ZipInstall(archive, folder, target)
+    install.copy = [(relative, 0 if relative in install.links else info.file_size)
+                    for relative, info in install.members.items()]
+    try:
+        install.extract_all()
+    finally:
+        install.close()
+    return install
+
+
+class ZipInstall(InstallPlan):
+    def __init__(self, archive, folder, dest, skip=(), progress=None):
+        # The folder-install constructor walks a source folder; here the archive's central directory is listed
+        # instead, and nothing in the destination is read until plan().
+        self.src = f"{os.path.abspath(archive)}/{folder}"
+        self.dest = dest
+        self.archive = archive
+        self.zip = None
+        self.open()
+        self.progress = progress
+        self.lock = threading.Lock()
+        self.previous = load_manifest(dest)
+        self.installed = manifest_files(self.previous)
+        self.folders = []
+        self.copy = []
+        self.replace = []
+        self.remove = []
+        self.unchanged = 0
+        self.stale = False
+        self.bundles = {}
+        self.members = {}  # Relative path -> ZipInfo
+        self.links = set()  # Relative paths of symlinks, which macOS bundles with frameworks carry
+        self.found = False  # Whether the archive has the folder at all, skipped items included
+
+        for info in self.zip.infolist():
+            parts = member_path(info, folder)
+            if not parts:
+                continue
+            self.found = True
+            if parts[0] in skip:
+                continue
+            relative = os.path.join(*parts)
+            self.bundles.setdefault(parts[0], {})
+            if info.is_dir():
+                self.folders.append(relative)
+            elif is_symlink(info):
+                self.links.add(relative)
+                self.members[relative] = info
+            else:
+                self.members[relative] = info
+
+    def open(self):
+        # A plan can be closed after planning, so one that is only shown in a dry run doesn't hold the archive open,
+        # and opened again to install.
+        if self.zip is None:
+            self.zip = zipfile.ZipFile(self.archive)
+
+    def close(self):
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
+
+    def exists(self):
+        return self.found
+
+    def plan(self, workers=None):
+        # Comparing means reading the installed files, so it is spread over the workers like the extraction.
+        with ThreadPoolExecutor(max_workers=workers or EXTRACT_WORKERS) as pool:
+            list(pool.map(self.check, [relative for relative in self.members if relative not in self.links]))
+        self.copy.sort(key=lambda file: file[1], reverse=True)
+        # Links are planned like InstallPlan.add_link does: a changed one is backed up and replaced, a new one is
+        # listed as added, so a rollback puts them back the way they were.
+        for relative in sorted(self.links):
+            entry = link_entry(self.link_target(relative))
+            target = os.path.join(self.dest, relative)
+            if os.path.islink(target) and link_entry(os.readlink(target)) == entry:
+                self.bundles[relative.split(os.sep, 1)[0]][relative] = entry
+                self.unchanged += 1
+                self.stale = self.stale or self.installed.get(relative) != entry
+                continue
+            self.copy.append((relative, 0))
+            if os.path.lexists(target):
+                self.replace.append(relative)
+
+        for item, bundle in self.bundles.items():
+            previous_bundle = (self.previous or {}).get('bundles', {}).get(item, {})
+            self.remove.extend(path for path in previous_bundle if path not in self.members
+                               and os.path.lexists(os.path.join(self.dest, path)))
+
+    def check(self, relative):
+        info = self.members[relative]
+        target = os.path.join(self.dest, relative)
+        self.check_folder(relative)
+        entry = manifest_entry(info)
+        try:
+            target_info = os.stat(target)
+        except OSError:
+            target_info = None
+        target_size = target_info.st_size if target_info else None
+        # A file the manifest has with this member's CRC, and that still has the time it was given then, isn't read
+        # again; anything else with the right size has its CRC compared.
+        recorded = target_info and target_info.st_mtime_ns == entry[1] and self.installed.get(relative) == entry
+        if target_size == info.file_size and (recorded or file_crc(target) == info.CRC):
+            with self.lock:
+                self.bundles[relative.split(os.sep, 1)[0]][relative] = entry
+                self.unchanged += 1
+                self.stale = self.stale or self.installed.get(relative) != entry
+            return
+        with self.lock:
+            self.copy.append((relative, info.file_size))
+            if target_size is not None:
+                self.replace.append(relative)
+
+    def install(self, workers=None):
+        # Same order as a folder install: old files into the backup, new ones in, the manifest last.
+        os.makedirs(self.dest, exist_ok=True)
+        self.backup()
+        self.extract_all(workers)
+        self.commit()
+
+    def extract_all(self, workers=None):
+        for folder in self.folders:
+            os.makedirs(os.path.join(self.dest, folder), exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers or EXTRACT_WORKERS) as pool:
+            list(pool.map(self.extract, [relative for relative, _ in self.copy if relative not in self.links]))
+        # Once the files are in, so a link never leads a member somewhere else on the way.
+        for relative in [relative for relative, _ in self.copy if relative in self.links]:
+            self.extract_link(relative)
+
+    def extract(self, relative):
+        info = self.members[relative]
+        target = os.path.join(self.dest, relative)
+        partial = target + PARTIAL_SUFFIX
+        self.check_folder(relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            # ZipExtFile raises BadZipFile once the last block is read if the CRC-32 doesn't match.
+            with self.zip.open(info) as source, open(partial, 'wb') as f:
+                for block in iter(lambda: source.read(EXTRACT_CHUNK_SIZE), b''):
+                    f.write(block)
+                    if self.progress:
+                        self.progress.advance(len(block))
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        os.replace(partial, target)
+
+        mode = (info.external_attr >> 16) & 0o777
+        if mode:
+            os.chmod(target, mode)  # Keeps the executable bit on plugin binaries
+        mtime = member_mtime_ns(info)
+        os.utime(target, ns=(mtime, mtime))
+        with self.lock:
+            self.bundles[relative.split(os.sep, 1)[0]][relative] = manifest_entry(info)
+        if self.progress:
+            self.progress.advance(0, files=1)
+
+    def check_folder(self, relative):
+        # A symlink already in the destination (from this archive or an earlier one) must not lead a member out of it.
+        if not contained(os.path.dirname(os.path.join(self.dest, relative)), self.dest):
+            raise ValueError(f"{relative} would be written outside {self.dest} through a symlink")
+
+    def link_target(self, relative):
+        # Frameworks link within their bundle (Versions/Current -> A); anything that leads out of the destination is
+        # refused, whether it is absolute or climbs out with '..'.
+        link = self.zip.read(self.members[relative]).decode('utf-8')
+        target = os.path.join(self.dest, relative)
+        if (not link or os.path.isabs(link) or os.path.splitdrive(link)[0]
+                or not contained(os.path.join(os.path.dirname(target), link), self.dest)):
+            raise ValueError(f"Unsafe symlink {relative} -> {link}")
+        return link
+
+    def extract_link(self, relative):
+        # Whatever was there before has been moved into the backup by now.
+        link = self.link_target(relative)
+        target = os.path.join(self.dest, relative)
+        self.check_folder(relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.symlink(link, target)
+        with self.lock:
+            self.bundles[relative.split(os.sep, 1)[0]][relative] = link_entry(link)
+        if self.progress:
+            self.progress.advance(0, files=1)
+
+
+def install_from_zip(archive, folder, dest, skip=(), progress=None, workers=None, plan=None):
+    install = plan or ZipInstall(archive, folder, dest, skip, progress)
+    try:
+        install.open()
+        if not install.exists():
+            return f"{folder} is not in {archive}. Skipping.\n"
+        if plan is None:
+            install.plan(workers)
+        if not install.changed():
+            if install.stale:
+                install.commit()
+            return f"{archive}/{folder} is already installed in {dest} ({install.summary()})\n"
+        install.install(workers)
+        return f"Installed {archive}/{folder} into {dest} ({install.summary()})\n"
+    finally:
+        install.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Install one folder of a plugin zip archive')
+    parser.add_argument('archive')
+    parser.add_argument('folder')
+    parser.add_argument('dest')
+    parser.add_argument('--skip', nargs='*', default=[], help='Top-level items to leave out')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+    try:
+        print(install_from_zip(args.archive, args.folder, args.dest, args.skip, workers=args.workers), end='')
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        sys.exit(f"Could not install {args.folder} from {args.archive}: {e}")
@@ -10,6 +10,53 @@ For each argument of the S3Uploader app, the GUI provides a dropdown menu to sel
 The 'Browse...' buttons allow for file system navigation to select directories.
 
 After selecting all necessary information, pressing the 'Run' button will run the S3Uploader app with the provided arguments.
+The app runs in the background, so the window stays responsive during long uploads. Its output is streamed into the log
+pane as it is printed, and progress lines are counted into a files-done and throughput display. The 'Cancel' button
+stops the upload: S3Uploader is asked to terminate, and is killed if it hasn't exited after a few seconds.
+
+Job queue:
+'Add Job' queues the current input/output pair and options, so a whole delivery of library folders can be queued and
+uploaded with one press of 'Run' (which also queues the current form if nothing is waiting). Up to 'Max Jobs' uploads
+run at the same time, except that a job with 'Hog CPU' set always runs on its own. The job list shows the status and
+progress of every job, and the status line shows the total throughput. 'Remove Job' drops the selected job if it
+hasn't started yet, and 'Cancel' stops everything that is running or queued.
+
+Incremental uploads:
+With 'Incremental' set, the interface keeps an index of every file in the input directory (path, size, modification
+time and, with 'Yes, hash contents', a SHA-256 of the contents) in ~/.s3uploader/index, one per input and output
+directory pair, so uploading a folder to a second destination still sends everything. Before a run it scans the input
+directory, compares it with the index saved after the last successful run, and hard links just the new and changed
+files into a staging folder of the same name next to the input directory, which S3Uploader then gets as its input. No
+audio is copied; symlinks are used where hard links aren't possible, such as across volumes. The index is only saved
+once S3Uploader has finished successfully, so a failed or cancelled run is picked up again next time. A run with
+nothing new finishes without starting S3Uploader at all. Hashing only reads files whose size or modification time
+changed, and means a file that was touched but not altered isn't uploaded again.
+
+Watch folder:
+'Watch' monitors the input directory and uploads whatever lands in it, for delivery folders that files are bounced
+into all day. It uses inotify on Linux and polls the folder everywhere else (or if inotify can't be set up). A new or
+changed file is only picked up once its size and modification time have stayed the same for WATCH_STABLE_SECONDS, so
+a WAV that is still being written is never uploaded. Stable files are collected into one batch until the folder has
+gone quiet, or WATCH_MAX_BATCH_WAIT seconds have passed, or WATCH_MAX_BATCH_FILES files are waiting. Each batch is
+hard linked into its own staging folder and queued as an ordinary job with the current options, so one S3Uploader run
+handles the whole batch. Files already in the folder when watching starts, and hidden files such as .DS_Store, are
+left alone. If a batch fails its files go back into the watch, to be retried with the next batch. Press 'Watch' again
+to stop.
+
+Run history:
+Every S3Uploader run is recorded in ~/.s3uploader/history.sqlite3 with its options, input size, file count, wall
+time, exit code, throughput and how many other jobs were running alongside it. 'History' opens a comparison of the
+recent runs grouped by their Hog CPU / Loudness / Analysis / Skip combination (runs, failures, average wall time,
+average and best MB/s), above a list of the latest runs, to show what each option costs and whether uploads are
+getting slower. Runs where S3Uploader never started (cancelled in pre-flight, or nothing changed) aren't recorded.
+
+The queue can also be run without the GUI, which is how it is tested against a stub S3Uploader:
+python S3UploaderInterface.py --app /path/to/S3Uploader.app --job in1 out1 --job in2 out2 --max-jobs 3 --hog no
+python S3UploaderInterface.py --app /path/to/S3Uploader.app --jobs-file jobs.csv
+python S3UploaderInterface.py --app /path/to/S3Uploader.app --job deliveries uploads --watch
+where jobs.csv has one "input directory,output directory" row per job; with --watch the input directories are watched
+until Ctrl-C instead of being uploaded once. "python S3UploaderInterface.py --history" prints the run history comparison. The executable that is run is always
+<app>/Contents/MacOS/S3Uploader, so a folder with a script at that path stands in for the real app.
 
 Styling:
 Background color is #494d7e
@@ -25,10 +72,655 @@ Date: 16th July 2023
 """
 
 
-import tkinter as tk
-from tkinter import filedialog
+import os
+import re
+import sys
+import csv
+import json
+import stat
+import time
+import queue
+import ctypes
+import select
+import shutil
+import struct
+import sqlite3
+import hashlib
+import ctypes.util
+import argparse
+import threading
 import subprocess
-from tkinter import font as tkfont
+
+POLL_INTERVAL_MS = 100  # How often the GUI drains the output queue
+MAX_LINES_PER_POLL = 500  # Keeps a burst of output from stalling the window
+CANCEL_GRACE_SECONDS = 5  # Time S3Uploader gets to exit after a terminate before it is killed
+MAX_CONCURRENT_JOBS = 2  # Lightweight uploads run side by side; a hogging one always runs alone
+INDEX_DIR = os.path.expanduser('~/.s3uploader/index')  # One pre-flight index per input and output directory
+STAGING_DIR = os.path.expanduser('~/.s3uploader/staging')  # Fallback when the input's parent isn't writable
+HISTORY_DB = os.path.expanduser('~/.s3uploader/history.sqlite3')
+HISTORY_COMPARE_RUNS = 200  # How many of the latest runs the flag comparison covers
+HASH_BLOCK_SIZE = 1024 * 1024
+WATCH_STABLE_SECONDS = 10  # A file has to keep its size and modification time this long before it is uploaded
+WATCH_CHECK_SECONDS = 1  # How often waiting files are checked for stability
+WATCH_POLL_SECONDS = 5  # How often the folder is rescanned when inotify isn't available
+WATCH_MAX_BATCH_WAIT = 120  # Upload a batch after this long even if other files are still being written
+WATCH_MAX_BATCH_FILES = 500
+
+# A standalone "12/340", "[12/340]" or "12 of 340" is read as files done out of the total; digits inside a path aren't.
+COUNT_PATTERN = re.compile(r'(?:^|[\s\[(])(\d+)\s*(?:/|of)\s*(\d+)(?=$|[\s\]),:])')
+# Lines reporting a single finished file, for output without a running count.
+FILE_DONE_PATTERN = re.compile(r'^\s*(uploaded|uploading|processed|processing|skipped|skipping|done)\b', re.IGNORECASE)
+SIZE_PATTERN = re.compile(r'(\d+(?:\.\d+)?)\s*(B|KB|MB|GB|KiB|MiB|GiB)\b')
+SIZE_UNITS = {'B': 1, 'KB': 1000, 'MB': 1000 ** 2, 'GB': 1000 ** 3, 'KiB': 1024, 'MiB': 1024 ** 2, 'GiB': 1024 ** 3}
+
+# Every job's reader threads push (job, stream name, line) here; the GUI or the headless loop drains it.
+output_queue = queue.Queue()
+# Watchers push (watcher, staging directory, relative paths) here for the GUI or the headless loop to queue as jobs.
+batch_queue = queue.Queue()
+polling = False
+
+
+class UploadProgress:
+    def __init__(self):
+        self.start = time.monotonic()
+        self.files_done = 0
+        self.files_total = None
+        self.bytes_done = 0
+
+    def feed(self, line):
+        count = COUNT_PATTERN.search(line)
+        # More done than the total means the match was a date or a ratio, not a count.
+        if count and int(count.group(1)) <= int(count.group(2)):
+            self.files_done = max(self.files_done, int(count.group(1)))
+            self.files_total = int(count.group(2))
+        elif FILE_DONE_PATTERN.match(line):
+            self.files_done += 1
+        else:
+            return
+        size = SIZE_PATTERN.search(line)
+        if size:
+            self.bytes_done += float(size.group(1)) * SIZE_UNITS[size.group(2)]
+
+    def summary(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        total = f"/{self.files_total}" if self.files_total else ''
+        text = f"{self.files_done}{total} files, {self.files_done / elapsed * 60:.1f} files/min"
+        if self.bytes_done:
+            text += f", {self.bytes_done / elapsed / 1e6:.2f} MB/s"
+        return text + f", {time.strftime('%H:%M:%S', time.gmtime(elapsed))} elapsed"
+
+
+def build_command(app, input_dir, output_dir, hog=True, loudness=True, analysis=True, skip=False):
+    return [
+        f"{app}/Contents/MacOS/S3Uploader",
+        "--in", input_dir,
+        "--out", output_dir,
+        "--hog", '1' if hog else '0',
+        "--loudness", '1' if loudness else '0',
+        "--analysis", '1' if analysis else '0',
+        "--skip", '1' if skip else '0',
+    ]
+
+
+def directory_size(path):
+    total = count = 0
+    for dirpath, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.stat(os.path.join(dirpath, filename)).st_size
+                count += 1
+            except OSError:
+                pass
+    return total, count
+
+
+def scan_directory(root):
+    # os.scandir hands back the file type without a stat call, and on macOS the stat below is the only one per file.
+    files = {}
+    prefix = len(os.path.join(root, ''))
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files[entry.path[prefix:]] = [stat.st_size, stat.st_mtime_ns, None]
+    return files
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def staging_dir_for(input_dir, tag=''):
+    # Next to the input directory, so it is on the same volume and hard links work.
+    input_dir = os.path.abspath(input_dir)
+    parent, name = os.path.split(input_dir)
+    # Inside a folder of its own, keeping the input's name, as S3Uploader uses the folder name.
+    if os.access(parent, os.W_OK):
+        return os.path.join(parent, f".{name}.s3staging{tag}", name)
+    return os.path.join(STAGING_DIR, hashlib.sha256(input_dir.encode('utf-8')).hexdigest()[:16] + tag, name)
+
+
+def stage_files(input_dir, relative_paths, staging_dir):
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    created = set()
+    linked = symlinked = 0
+    for relative_path in relative_paths:
+        source = os.path.join(input_dir, relative_path)
+        target = os.path.join(staging_dir, relative_path)
+        parent = os.path.dirname(target)
+        if parent not in created:
+            os.makedirs(parent, exist_ok=True)
+            created.add(parent)
+        try:
+            os.link(source, target)
+            linked += 1
+        except OSError:
+            os.symlink(os.path.abspath(source), target)
+            symlinked += 1
+    return linked, symlinked
+
+
+class PreflightIndex:
+    def __init__(self, input_dir, output_dir, hash_contents=False):
+        # What has been uploaded depends on where it went as much as on where it came from.
+        self.input_dir = os.path.abspath(input_dir)
+        self.output_dir = output_dir
+        self.hash_contents = hash_contents
+        self.key = hashlib.sha256(f"{self.input_dir}\0{self.output_dir}".encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(INDEX_DIR, f"{self.key}.json")
+        self.files = None
+        self.changed = []
+        self.removed = 0
+        try:
+            with open(self.path) as f:
+                self.previous = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            self.previous = {}
+
+    def scan(self):
+        self.files = scan_directory(self.input_dir)
+        self.changed = []
+        for relative_path, entry in self.files.items():
+            previous = self.previous.get(relative_path)
+            if previous and previous[:2] == entry[:2]:
+                entry[2] = previous[2]
+                continue
+            if self.hash_contents:
+                try:
+                    entry[2] = file_digest(os.path.join(self.input_dir, relative_path))
+                except OSError:
+                    pass
+                if previous and previous[2] and previous[2] == entry[2]:
+                    continue
+            self.changed.append(relative_path)
+        self.removed = sum(1 for relative_path in self.previous if relative_path not in self.files)
+        return self.changed
+
+    def stage(self):
+        staging_dir = staging_dir_for(self.input_dir, f"-{self.key[:8]}")
+        return (staging_dir,) + stage_files(self.input_dir, self.changed, staging_dir)
+
+    def save(self):
+        os.makedirs(INDEX_DIR, exist_ok=True)
+        with open(f"{self.path}.tmp", 'w') as f:
+            json.dump({'input_dir': self.input_dir, 'output_dir': self.output_dir, 'files': self.files}, f)
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+class Inotify:
+    # Just enough of the Linux inotify API, through libc, to watch a directory tree without extra packages.
+    MASK = 0x2 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200  # IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_FROM/TO, IN_CREATE/DELETE
+    IN_Q_OVERFLOW = 0x4000
+    IN_ISDIR = 0x40000000
+    EVENT = struct.Struct('iIII')
+
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches = {}
+
+    def add_tree(self, root):
+        for dirpath, _, _ in os.walk(root):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dirpath), self.MASK)
+            if wd >= 0:
+                self.watches[wd] = dirpath
+
+    def read(self, timeout):
+        # Returns the paths that changed, new directories included, or None when the kernel queue overflowed.
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            name = data[offset + self.EVENT.size: offset + self.EVENT.size + length].rstrip(b'\0')
+            offset += self.EVENT.size + length
+            if mask & self.IN_Q_OVERFLOW:
+                return None
+            if wd in self.watches and name:
+                path = os.path.join(self.watches[wd], os.fsdecode(name))
+                if mask & self.IN_ISDIR:
+                    self.add_tree(path)
+                paths.append(path)
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    def __init__(self, input_dir, job_options):
+        self.input_dir = os.path.abspath(input_dir)
+        self.job_options = job_options  # Keyword arguments for the UploadJob of each batch
+        self.known = {}  # Relative path -> (size, mtime) of files that were there at the start or have been batched
+        self.pending = {}  # Relative path -> [(size, mtime) when last checked, time it last changed]
+        self.ready = {}
+        self.ready_since = None
+        self.batches = 0
+        self.backend = None
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        notifier = None
+        if sys.platform.startswith('linux'):
+            try:
+                notifier = Inotify()
+                notifier.add_tree(self.input_dir)
+            except (OSError, AttributeError):
+                notifier = None
+        self.backend = 'inotify' if notifier else 'polling'
+        self.known = {path: tuple(entry[:2]) for path, entry in scan_directory(self.input_dir).items()}
+        last_scan = time.monotonic()
+
+        while not self.stop_event.is_set():
+            if notifier:
+                paths = notifier.read(WATCH_CHECK_SECONDS)
+                if paths is None:
+                    self.rescan()
+                for path in paths or []:
+                    if os.path.isdir(path):
+                        # Files can land in a new folder before its watch is added, so look inside it once.
+                        for relative_path in scan_directory(path):
+                            self.touch(os.path.join(os.path.relpath(path, self.input_dir), relative_path))
+                    else:
+                        self.touch(os.path.relpath(path, self.input_dir))
+            else:
+                self.stop_event.wait(WATCH_CHECK_SECONDS)
+                if time.monotonic() - last_scan >= WATCH_POLL_SECONDS:
+                    self.rescan()
+                    last_scan = time.monotonic()
+            self.check()
+
+        if notifier:
+            notifier.close()
+
+    def rescan(self):
+        for relative_path, entry in scan_directory(self.input_dir).items():
+            if self.known.get(relative_path) != tuple(entry[:2]):
+                self.touch(relative_path)
+
+    def touch(self, relative_path):
+        if any(part.startswith('.') for part in relative_path.split(os.sep)):
+            return
+        with self.lock:
+            self.pending.setdefault(relative_path, [None, time.monotonic()])
+
+    def check(self):
+        now = time.monotonic()
+        with self.lock:
+            for relative_path, state in list(self.pending.items()):
+                try:
+                    info = os.stat(os.path.join(self.input_dir, relative_path))
+                except OSError:
+                    del self.pending[relative_path]
+                    continue
+                signature = (info.st_size, info.st_mtime_ns)
+                if not stat.S_ISREG(info.st_mode) or self.known.get(relative_path) == signature:
+                    del self.pending[relative_path]
+                elif state[0] != signature:
+                    self.pending[relative_path] = [signature, now]
+                elif now - state[1] >= WATCH_STABLE_SECONDS:
+                    del self.pending[relative_path]
+                    self.ready[relative_path] = signature
+                    self.ready_since = self.ready_since or now
+
+            # Wait for the folder to go quiet, so a delivery of many files goes up as one batch.
+            if not self.ready or (self.pending and now - self.ready_since < WATCH_MAX_BATCH_WAIT
+                                  and len(self.ready) < WATCH_MAX_BATCH_FILES):
+                return
+            batch = sorted(path for path in self.ready if path not in self.pending)
+            self.known.update(self.ready)
+            self.ready = {}
+            self.ready_since = None
+            self.batches += 1
+
+        staging_dir = staging_dir_for(self.input_dir, f"-{os.getpid()}-{self.batches}")
+        try:
+            stage_files(self.input_dir, batch, staging_dir)
+        except OSError as e:
+            output_queue.put((None, 'stderr', f"Could not stage a batch from {self.input_dir}: {e}"))
+            self.retry(batch)
+            return
+        batch_queue.put((self, staging_dir, batch))
+
+    def retry(self, batch):
+        # Forget that the files were batched, so the next check picks them up again.
+        with self.lock:
+            for relative_path in batch:
+                self.known.pop(relative_path, None)
+                self.pending.setdefault(relative_path, [None, time.monotonic()])
+
+
+class UploadJob:
+    def __init__(self, app, input_dir, output_dir, hog=True, loudness=True, analysis=True, skip=False,
+                 incremental=False, hash_contents=False, staging_dir=None, watcher=None, batch=None):
+        self.app = app
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.hog = hog
+        self.loudness = loudness
+        self.analysis = analysis
+        self.skip = skip
+        self.incremental = incremental
+        self.hash_contents = hash_contents
+        self.status = 'queued'
+        self.process = None
+        self.launcher = None
+        self.readers = []
+        self.progress = None
+        self.index = None
+        self.staging_dir = staging_dir
+        self.watcher = watcher
+        self.batch = batch
+        self.input_bytes = None
+        self.input_files = None
+        self.concurrent_jobs = 1
+        self.started = self.finished = None
+        self.cancelled_at = None
+
+    def command(self):
+        return build_command(self.app, self.staging_dir or self.input_dir, self.output_dir,
+                             self.hog, self.loudness, self.analysis, self.skip)
+
+    def start(self):
+        # The pre-flight scan of a big library can take a while, so it runs with the launch off the caller's thread.
+        self.started = time.monotonic()
+        self.progress = UploadProgress()
+        self.status = 'running'
+        self.launcher = threading.Thread(target=self.launch, daemon=True)
+        self.launcher.start()
+
+    def launch(self):
+        try:
+            if self.incremental and not self.preflight():
+                return
+            if self.cancelled_at:
+                return
+            # Line buffered text pipes; PYTHONUNBUFFERED only matters if S3Uploader is itself a Python program.
+            process = subprocess.Popen(self.command(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                       text=True, bufsize=1, env={**os.environ, 'PYTHONUNBUFFERED': '1'})
+        except OSError as e:
+            output_queue.put((self, 'stderr', f"Could not start S3Uploader: {e}"))
+            return
+        # One reader thread per pipe, so a chatty stderr can't block on a full pipe while stdout is being read.
+        # The input size is measured alongside the upload, for the throughput once the job is done.
+        self.readers = [threading.Thread(target=self.read_stream, args=(stream, name), daemon=True)
+                        for stream, name in ((process.stdout, 'stdout'), (process.stderr, 'stderr'))]
+        self.readers.append(threading.Thread(target=self.measure_input, daemon=True))
+        for reader in self.readers:
+            reader.start()
+        self.process = process
+
+    def preflight(self):
+        start = time.monotonic()
+        self.index = PreflightIndex(self.input_dir, self.output_dir, self.hash_contents)
+        changed = self.index.scan()
+        output_queue.put((self, 'info', f"Pre-flight: {len(self.index.files)} files scanned in "
+                                        f"{time.monotonic() - start:.1f}s, {len(changed)} new or changed, "
+                                        f"{self.index.removed} removed since the last successful run"))
+        if not changed:
+            return False
+        self.staging_dir, linked, symlinked = self.index.stage()
+        output_queue.put((self, 'info', f"Staged {linked} hard links and {symlinked} symlinks in {self.staging_dir}"))
+        return True
+
+    def read_stream(self, stream, name):
+        for line in iter(stream.readline, ''):
+            output_queue.put((self, name, line.rstrip('\n')))
+        stream.close()
+
+    def measure_input(self):
+        self.input_bytes, self.input_files = directory_size(self.staging_dir or self.input_dir)
+
+    def update(self):
+        # The job is over once the process has exited and both pipes have been drained.
+        if self.status != 'running' or self.launcher.is_alive():
+            return
+        if self.process is None:
+            self.finish(self.finished_without_process())
+            return
+        if self.cancelled_at and self.process.poll() is None \
+                and time.monotonic() - self.cancelled_at > CANCEL_GRACE_SECONDS:
+            self.process.kill()
+        if self.process.poll() is None or any(reader.is_alive() for reader in self.readers):
+            return
+        if self.cancelled_at:
+            self.finish('cancelled')
+        elif self.process.returncode == 0:
+            self.finish('done')
+        else:
+            self.finish(f"failed ({self.process.returncode})")
+
+    def finished_without_process(self):
+        # Either cancelled during the pre-flight, an incremental run with nothing to upload, or a failed launch.
+        if self.cancelled_at:
+            return 'cancelled'
+        if self.index and self.index.files is not None and not self.index.changed:
+            self.input_bytes = 0
+            return 'done'
+        return 'failed'
+
+    def finish(self, status):
+        self.finished = time.monotonic()
+        self.status = status
+        if self.index and status == 'done':
+            try:
+                self.index.save()
+            except OSError as e:
+                output_queue.put((self, 'stderr', f"Could not save the pre-flight index: {e}"))
+        if self.watcher and status != 'done':
+            self.watcher.retry(self.batch)
+        if self.process:
+            try:
+                history.record(self)
+            except sqlite3.Error as e:
+                output_queue.put((self, 'stderr', f"Could not record the run in the history: {e}"))
+        if self.staging_dir:
+            shutil.rmtree(os.path.dirname(self.staging_dir), ignore_errors=True)
+
+    def cancel(self):
+        if self.status == 'queued':
+            self.status = 'cancelled'
+        elif self.status == 'running' and not self.cancelled_at:
+            self.cancelled_at = time.monotonic()
+            if self.process:
+                self.process.terminate()
+
+    def bytes_done(self):
+        if self.status == 'done' and self.input_bytes is not None:
+            return self.input_bytes
+        return self.progress.bytes_done if self.progress else 0
+
+    def describe(self):
+        flags = ' hog' if self.hog else ''
+        if self.batch:
+            flags += f" (watched batch of {len(self.batch)})"
+        text = f"{self.status:<12} {self.input_dir} -> {self.output_dir}{flags}"
+        if self.progress:
+            text += f"  [{self.progress.summary()}]"
+        return text
+
+
+class RunHistory:
+    COLUMNS = ('started_at', 'input_dir', 'output_dir', 'hog', 'loudness', 'analysis', 'skip', 'incremental',
+               'concurrent_jobs', 'input_bytes', 'file_count', 'files_reported', 'wall_seconds', 'exit_code', 'status',
+               'mb_per_second')
+
+    def __init__(self, path=None):
+        self.path = path or HISTORY_DB
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS runs (id INTEGER PRIMARY KEY, started_at TEXT, input_dir TEXT, output_dir TEXT, '
+            'hog INTEGER, loudness INTEGER, analysis INTEGER, skip INTEGER, incremental INTEGER, concurrent_jobs INTEGER, '
+            'input_bytes INTEGER, file_count INTEGER, files_reported INTEGER, wall_seconds REAL, exit_code INTEGER, '
+            'status TEXT, mb_per_second REAL)')
+        return connection
+
+    def record(self, job):
+        wall = job.finished - job.started
+        input_bytes = job.input_bytes or 0
+        row = (time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - (time.monotonic() - job.started))),
+               job.input_dir, job.output_dir, job.hog, job.loudness, job.analysis, job.skip, job.incremental,
+               job.concurrent_jobs, input_bytes, job.input_files, job.progress.files_done, wall,
+               job.process.returncode, job.status.split()[0], input_bytes / wall / 1e6 if wall > 0 else None)
+        with self.connect() as connection:
+            connection.execute(f"INSERT INTO runs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(row))})", row)
+        connection.close()
+
+    def compare(self, limit=None):
+        # Throughput is only averaged over successful runs; a failure early on would make its flags look fast or slow.
+        with self.connect() as connection:
+            rows = connection.execute(
+                'SELECT hog, loudness, analysis, skip, COUNT(*), SUM(status != \'done\'), '
+                'AVG(CASE WHEN status = \'done\' THEN wall_seconds END), '
+                'AVG(CASE WHEN status = \'done\' THEN mb_per_second END), '
+                'MAX(CASE WHEN status = \'done\' THEN mb_per_second END), SUM(input_bytes) '
+                'FROM (SELECT * FROM runs ORDER BY id DESC LIMIT ?) '
+                'GROUP BY hog, loudness, analysis, skip ORDER BY 8 DESC', (limit or HISTORY_COMPARE_RUNS,)).fetchall()
+        connection.close()
+        return rows
+
+    def recent(self, limit=20):
+        with self.connect() as connection:
+            rows = connection.execute(
+                'SELECT started_at, input_dir, hog, loudness, analysis, skip, concurrent_jobs, input_bytes, file_count, '
+                'wall_seconds, exit_code, mb_per_second FROM runs ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        connection.close()
+        return rows
+
+    def report(self):
+        yes_no = lambda flag: 'Yes' if flag else 'No'
+        lines = [f"Latest {HISTORY_COMPARE_RUNS} runs by options:",
+                 f"{'Hog':<4} {'Loud':<4} {'Anal':<4} {'Skip':<4} {'runs':>5} {'failed':>6} {'avg wall':>9} "
+                 f"{'avg MB/s':>9} {'best MB/s':>9} {'total GB':>9}"]
+        for hog, loudness, analysis, skip, runs, failed, wall, mbps, best, total in self.compare():
+            lines.append(f"{yes_no(hog):<4} {yes_no(loudness):<4} {yes_no(analysis):<4} {yes_no(skip):<4} {runs:>5} "
+                         f"{failed:>6} {wall or 0:>8.1f}s {mbps or 0:>9.2f} {best or 0:>9.2f} {(total or 0) / 1e9:>9.2f}")
+        lines += ['', 'Latest runs:',
+                  f"{'started':<19} {'H L A S':<7} {'jobs':>4} {'files':>7} {'GB':>7} {'wall':>8} {'exit':>4} "
+                  f"{'MB/s':>7}  input"]
+        for started, input_dir, hog, loudness, analysis, skip, jobs, size, files, wall, exit_code, mbps in self.recent():
+            flags = ' '.join('Y' if flag else 'N' for flag in (hog, loudness, analysis, skip))
+            lines.append(f"{started:<19} {flags:<7} {jobs:>4} {files or 0:>7} {(size or 0) / 1e9:>7.2f} {wall:>7.1f}s "
+                         f"{exit_code:>4} {mbps or 0:>7.2f}  {input_dir}")
+        return '\n'.join(lines)
+
+
+history = RunHistory()
+
+
+def queue_batches(scheduler):
+    while True:
+        try:
+            watcher, staging_dir, batch = batch_queue.get_nowait()
+        except queue.Empty:
+            return
+        scheduler.add(UploadJob(**watcher.job_options, staging_dir=staging_dir, watcher=watcher, batch=batch))
+
+
+def log_prefix(scheduler, job):
+    return f"[{scheduler.jobs.index(job) + 1}] " if job in scheduler.jobs else ''
+
+
+class UploadScheduler:
+    def __init__(self, max_jobs=None):
+        self.max_jobs = max_jobs or MAX_CONCURRENT_JOBS
+        self.jobs = []
+        self.started = None
+
+    def add(self, job):
+        self.jobs.append(job)
+        return job
+
+    def running(self):
+        return [job for job in self.jobs if job.status == 'running']
+
+    def active(self):
+        return any(job.status in ('queued', 'running') for job in self.jobs)
+
+    def tick(self):
+        for job in self.running():
+            job.update()
+
+        # Jobs start in the order they were queued. A hogging job waits until nothing else is running and then
+        # holds the machine to itself; nothing overtakes it, so it can't be starved by a stream of light jobs.
+        for job in [job for job in self.jobs if job.status == 'queued']:
+            running = self.running()
+            if running and (job.hog or any(other.hog for other in running) or len(running) >= self.max_jobs):
+                break
+            if self.started is None:
+                self.started = time.monotonic()
+            job.concurrent_jobs = len(running) + 1
+            job.start()
+        return self.active()
+
+    def cancel(self):
+        for job in self.jobs:
+            job.cancel()
+
+    def summary(self):
+        counts = {}
+        for job in self.jobs:
+            status = job.status.split()[0]
+            counts[status] = counts.get(status, 0) + 1
+        text = ', '.join(f"{count} {status}" for status, count in counts.items())
+        if self.started is not None:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            # Jobs left in the list from earlier runs would inflate the rate.
+            total = sum(job.bytes_done() for job in self.jobs
+                        if job.started is not None and job.started >= self.started)
+            text += f"; {total / 1e6:.1f} MB in {elapsed:.1f}s, {total / elapsed / 1e6:.2f} MB/s total"
+        return text
+
 
 def select_app_directory():
     filename = filedialog.askdirectory()
@@ -45,69 +737,305 @@ def select_output_directory():
     e2.delete(0, tk.END)
     e2.insert(0, filename)
 
+def append_log(line, tag=None):
+    log.configure(state='normal')
+    log.insert(tk.END, line + '\n', tag)
+    log.see(tk.END)
+    log.configure(state='disabled')
+
+def form_options():
+    return dict(app=e0.get(), input_dir=e1.get(), output_dir=e2.get(), hog=v_hog.get() == 'Yes',
+                loudness=v_loudness.get() == 'Yes', analysis=v_analysis.get() == 'Yes', skip=v_skip.get() == 'Yes')
+
+def job_from_form():
+    return UploadJob(**form_options(), incremental=v_incremental.get() != 'No',
+                     hash_contents=v_incremental.get() == incremental_options[2])
+
+def refresh_job_list():
+    selection = job_list.curselection()
+    job_list.delete(0, tk.END)
+    for number, job in enumerate(scheduler.jobs, 1):
+        job_list.insert(tk.END, f"{number:>3} {job.describe()}")
+    for index in selection:
+        job_list.selection_set(index)
+
+def add_job():
+    if not e1.get() or not e2.get():
+        status.set('Choose an input and an output directory first.')
+        return False
+    scheduler.add(job_from_form())
+    refresh_job_list()
+    return True
+
+def remove_job():
+    for index in reversed(job_list.curselection()):
+        if scheduler.jobs[index].status == 'queued':
+            del scheduler.jobs[index]
+    refresh_job_list()
+
+def start_polling():
+    global polling
+    try:
+        scheduler.max_jobs = max(1, int(v_max_jobs.get()))
+    except ValueError:
+        pass  # Not a number; keep the last good value
+    v_max_jobs.set(str(scheduler.max_jobs))
+    # Jobs added while others are running join the current run; otherwise this starts a new one.
+    if not polling:
+        polling = True
+        scheduler.started = None
+        root.after(POLL_INTERVAL_MS, poll_output)
+    cancel_button.configure(state='normal')
+
 def run_s3uploader():
-    cmd = [
-        f"{e0.get()}/Contents/MacOS/S3Uploader",
-        "--in", e1.get(),
-        "--out", e2.get(),
-        "--hog", '1' if v_hog.get() == 'Yes' else '0',
-        "--loudness", '1' if v_loudness.get() == 'Yes' else '0',
-        "--analysis", '1' if v_analysis.get() == 'Yes' else '0',
-        "--skip", '1' if v_skip.get() == 'Yes' else '0',
-    ]
-    subprocess.run(cmd)
+    if not any(job.status == 'queued' for job in scheduler.jobs) and not add_job():
+        return
+    start_polling()
+    status.set('Running...')
+
+def toggle_watch():
+    global watcher
+    if watcher:
+        watcher.stop()
+        append_log(f"Stopped watching {watcher.input_dir}.", 'info')
+        watcher = None
+        watch_button.configure(text='Watch')
+        return
+    if not e1.get() or not e2.get() or not os.path.isdir(e1.get()):
+        status.set('Choose an existing input directory and an output directory first.')
+        return
+    watcher = FolderWatcher(e1.get(), form_options())
+    watcher.start()
+    append_log(f"Watching {watcher.input_dir}; files are uploaded once they have been unchanged for "
+               f"{WATCH_STABLE_SECONDS}s.", 'info')
+    watch_button.configure(text='Stop Watching')
+    start_polling()
+
+def poll_output():
+    global polling
+    for _ in range(MAX_LINES_PER_POLL):
+        try:
+            job, name, line = output_queue.get_nowait()
+        except queue.Empty:
+            break
+        append_log(log_prefix(scheduler, job) + line, name)
+        if job and name != 'info':
+            job.progress.feed(line)
+
+    queue_batches(scheduler)
+    previous = [job.status for job in scheduler.jobs]
+    active = scheduler.tick()
+    for number, (job, before) in enumerate(zip(scheduler.jobs, previous), 1):
+        if job.status != before:
+            append_log(f"[{number}] {job.status}: {' '.join(job.command())}", 'info')
+    refresh_job_list()
+    status.set(scheduler.summary())
+
+    if active or watcher or not output_queue.empty():
+        root.after(POLL_INTERVAL_MS, poll_output)
+    else:
+        polling = False
+        cancel_button.configure(state='disabled')
+
+def cancel_s3uploader():
+    scheduler.cancel()
+    status.set('Cancelling...')
+
+def show_history():
+    try:
+        report = history.report()
+    except sqlite3.Error as e:
+        status.set(f"Could not read the run history: {e}")
+        return
+    window = tk.Toplevel(root)
+    window.title("S3Uploader Run History")
+    window.configure(bg='#494d7e')
+    text = tk.Text(window, height=36, width=120, bg='#8b6d9c', fg='#f2d3ab', font=stylish_font)
+    text.insert(tk.END, report)
+    text.configure(state='disabled')
+    text.pack(fill='both', expand=True)
+
+
+def read_jobs_file(path):
+    with open(path, newline='') as f:
+        return [(row[0].strip(), row[1].strip()) for row in csv.reader(f) if len(row) >= 2 and row[0].strip()]
+
+
+def run_headless(args):
+    scheduler = UploadScheduler(args.max_jobs)
+    pairs = (args.job or []) + (read_jobs_file(args.jobs_file) if args.jobs_file else [])
+    for input_dir, output_dir in pairs:
+        scheduler.add(UploadJob(args.app, input_dir, output_dir, hog=args.hog == 'yes', loudness=args.loudness == 'yes',
+                                analysis=args.analysis == 'yes', skip=args.skip == 'yes',
+                                incremental=args.incremental != 'no', hash_contents=args.incremental == 'hash'))
+    watchers = []
+    if args.watch:
+        # Watched directories aren't uploaded as they are; their jobs become the options for each batch.
+        for job in scheduler.jobs:
+            watcher = FolderWatcher(job.input_dir, dict(app=job.app, input_dir=job.input_dir, output_dir=job.output_dir,
+                                                        hog=job.hog, loudness=job.loudness, analysis=job.analysis,
+                                                        skip=job.skip))
+            watcher.start()
+            watchers.append(watcher)
+            print(f"Watching {watcher.input_dir} (Ctrl-C to stop)")
+        scheduler.jobs = []
+    else:
+        print(f"Running {len(scheduler.jobs)} upload(s), up to {scheduler.max_jobs} at a time")
+
+    statuses = {}
+    while True:
+        try:
+            queue_batches(scheduler)
+            active = scheduler.tick()
+            while True:
+                try:
+                    job, name, line = output_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job and name != 'info':
+                    job.progress.feed(line)
+                print(log_prefix(scheduler, job) + line, file=sys.stderr if name == 'stderr' else sys.stdout)
+            for number, job in enumerate(scheduler.jobs, 1):
+                if statuses.get(number) != job.status:
+                    statuses[number] = job.status
+                    print(f"[{number}] {job.describe()}")
+            if not active and not watchers and output_queue.empty():
+                break
+            time.sleep(POLL_INTERVAL_MS / 1000)
+        except KeyboardInterrupt:
+            print('Cancelling...')
+            for watcher in watchers:
+                watcher.stop()
+            watchers = []
+            scheduler.cancel()
+
+    print(scheduler.summary())
+    # Stopping a watch cancels the batch in progress, which isn't a failure.
+    finished = ('done', 'cancelled') if args.watch else ('done',)
+    return 0 if all(job.status in finished for job in scheduler.jobs) else 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Run S3Uploader jobs; opens the GUI when no jobs are given.')
+    parser.add_argument('--app', default='/Volumes/S3Uploader/S3Uploader.app', help='Location of S3Uploader.app')
+    parser.add_argument('--job', nargs=2, action='append', metavar=('IN', 'OUT'), help='An input/output pair to upload')
+    parser.add_argument('--jobs-file', help='CSV file with one "input,output" row per job')
+    parser.add_argument('--max-jobs', type=int, default=MAX_CONCURRENT_JOBS, help='Uploads to run at the same time')
+    for flag, default in (('hog', 'yes'), ('loudness', 'yes'), ('analysis', 'yes'), ('skip', 'no')):
+        parser.add_argument(f'--{flag}', choices=['yes', 'no'], default=default)
+    parser.add_argument('--incremental', choices=['no', 'yes', 'hash'], default='no',
+                        help='Upload only files that changed since the last successful run; "hash" also compares contents')
+    parser.add_argument('--watch', action='store_true', help='Watch the input directories and upload new files in batches')
+    parser.add_argument('--history', action='store_true', help='Print the run history comparison and exit')
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.history:
+        print(history.report())
+        sys.exit(0)
+    if args.job or args.jobs_file:
+        sys.exit(run_headless(args))
+
+    # Tk is only needed, and only imported, for the GUI.
+    import tkinter as tk
+    from tkinter import filedialog
+    from tkinter import font as tkfont
+
+    scheduler = UploadScheduler()
+    watcher = None
+
+    root = tk.Tk()
+    root.title("S3Uploader Interface")
+
+    # Styling
+    root.configure(bg='#494d7e')
+    stylish_font = tkfont.Font(family="Courier", size=12)
+
+    # Variables for holding dropdown options
+    v_hog = tk.StringVar(root)
+    v_loudness = tk.StringVar(root)
+    v_analysis = tk.StringVar(root)
+    v_skip = tk.StringVar(root)
+    v_max_jobs = tk.StringVar(root)
+    v_incremental = tk.StringVar(root)
+    status = tk.StringVar(root)
+
+    # Default values for the dropdowns
+    v_hog.set("Yes")
+    v_loudness.set("Yes")
+    v_analysis.set("Yes")
+    v_skip.set("No")
+    v_max_jobs.set(str(MAX_CONCURRENT_JOBS))
+    v_incremental.set("No")
+
+    options = ["Yes", "No"]  # The options in the dropdown
+    incremental_options = ["No", "Yes", "Yes, hash contents"]
+
+    labels = ['S3Uploader App Location:', 'Input Directory:', 'Output Directory:', 'Hog CPU:', 'Calculate Loudness:', 'Spectral Analysis:', 'Skip Existing:', 'Max Jobs:', 'Incremental:']
+    for i, label in enumerate(labels):
+        lbl = tk.Label(root, text=label, bg='#494d7e', fg='#f2d3ab', font=stylish_font)
+        lbl.grid(row=i, column=0, sticky='w')
+
+    e0 = tk.Entry(root, bg='#8b6d9c', fg='#f2d3ab', insertbackground='#f2d3ab')
+    e0.insert(0, args.app)
+    e1 = tk.Entry(root, bg='#8b6d9c', fg='#f2d3ab', insertbackground='#f2d3ab')
+    e2 = tk.Entry(root, bg='#8b6d9c', fg='#f2d3ab', insertbackground='#f2d3ab')
+
+    e0.grid(row=0, column=1)
+    e1.grid(row=1, column=1)
+    e2.grid(row=2, column=1)
 
-root = tk.Tk()
-root.title("S3Uploader Interface")
+    tk.OptionMenu(root, v_hog, *options).grid(row=3, column=1)
+    tk.OptionMenu(root, v_loudness, *options).grid(row=4, column=1)
+    tk.OptionMenu(root, v_analysis, *options).grid(row=5, column=1)
+    tk.OptionMenu(root, v_skip, *options).grid(row=6, column=1)
+    tk.Spinbox(root, from_=1, to=16, textvariable=v_max_jobs, width=4, bg='#8b6d9c', fg='#f2d3ab').grid(row=7, column=1)
+    tk.OptionMenu(root, v_incremental, *incremental_options).grid(row=8, column=1)
 
-# Styling
-root.configure(bg='#494d7e')
-stylish_font = tkfont.Font(family="Courier", size=12)
+    # Buttons for directory selection
+    browse_button0 = tk.Button(root, text="Browse...", command=select_app_directory, fg='#8b6d9c')
+    browse_button0.grid(row=0, column=2)
 
-# Variables for holding dropdown options
-v_hog = tk.StringVar(root)
-v_loudness = tk.StringVar(root)
-v_analysis = tk.StringVar(root)
-v_skip = tk.StringVar(root)
+    browse_button1 = tk.Button(root, text="Browse...", command=select_input_directory, fg='#8b6d9c')
+    browse_button1.grid(row=1, column=2)
 
-# Default values for the dropdowns
-v_hog.set("Yes")
-v_loudness.set("Yes")
-v_analysis.set("Yes")
-v_skip.set("No")
+    browse_button2 = tk.Button(root, text="Browse...", command=select_output_directory, fg='#8b6d9c')
+    browse_button2.grid(row=2, column=2)
 
-options = ["Yes", "No"]  # The options in the dropdown
+    # Job queue buttons
+    add_button = tk.Button(root, text='Add Job', command=add_job, fg='#8b6d9c')
+    add_button.grid(row=9, column=0)
 
-labels = ['S3Uploader App Location:', 'Input Directory:', 'Output Directory:', 'Hog CPU:', 'Calculate Loudness:', 'Spectral Analysis:', 'Skip Existing:']
-for i, label in enumerate(labels):
-    lbl = tk.Label(root, text=label, bg='#494d7e', fg='#f2d3ab', font=stylish_font)
-    lbl.grid(row=i, column=0, sticky='w')
+    remove_button = tk.Button(root, text='Remove Job', command=remove_job, fg='#8b6d9c')
+    remove_button.grid(row=9, column=1)
 
-e0 = tk.Entry(root, bg='#8b6d9c', fg='#f2d3ab', insertbackground='#f2d3ab')
-e0.insert(0, '/Volumes/S3Uploader/S3Uploader.app')
-e1 = tk.Entry(root, bg='#8b6d9c', fg='#f2d3ab', insertbackground='#f2d3ab')
-e2 = tk.Entry(root, bg='#8b6d9c', fg='#f2d3ab', insertbackground='#f2d3ab')
+    history_button = tk.Button(root, text='History', command=show_history, fg='#8b6d9c')
+    history_button.grid(row=9, column=2)
 
-e0.grid(row=0, column=1)
-e1.grid(row=1, column=1)
-e2.grid(row=2, column=1)
+    run_button = tk.Button(root, text='Run', command=run_s3uploader, fg='#8b6d9c')
+    run_button.grid(row=10, column=0)
 
-tk.OptionMenu(root, v_hog, *options).grid(row=3, column=1)
-tk.OptionMenu(root, v_loudness, *options).grid(row=4, column=1)
-tk.OptionMenu(root, v_analysis, *options).grid(row=5, column=1)
-tk.OptionMenu(root, v_skip, *options).grid(row=6, column=1)
+    watch_button = tk.Button(root, text='Watch', command=toggle_watch, fg='#8b6d9c')
+    watch_button.grid(row=10, column=1)
 
-# Buttons for directory selection
-browse_button0 = tk.Button(root, text="Browse...", command=select_app_directory, fg='#8b6d9c')
-browse_button0.grid(row=0, column=2)
+    cancel_button = tk.Button(root, text='Cancel', command=cancel_s3uploader, fg='#8b6d9c', state='disabled')
+    cancel_button.grid(row=10, column=2)
 
-browse_button1 = tk.Button(root, text="Browse...", command=select_input_directory, fg='#8b6d9c')
-browse_button1.grid(row=1, column=2)
+    # Queued and finished jobs
+    job_list = tk.Listbox(root, height=6, width=90, bg='#8b6d9c', fg='#f2d3ab', font=stylish_font, selectmode='extended')
+    job_list.grid(row=11, column=0, columnspan=3, sticky='nsew')
 
-browse_button2 = tk.Button(root, text="Browse...", command=select_output_directory, fg='#8b6d9c')
-browse_button2.grid(row=2, column=2)
+    # Progress and the streamed output of the running jobs
+    tk.Label(root, textvariable=status, bg='#494d7e', fg='#f2d3ab', font=stylish_font).grid(row=12, column=0, columnspan=3, sticky='w')
 
-run_button = tk.Button(root, text='Run', command=run_s3uploader, fg='#8b6d9c')
-run_button.grid(row=7, column=0, columnspan=2)
+    log = tk.Text(root, height=16, width=90, bg='#8b6d9c', fg='#f2d3ab', font=stylish_font, state='disabled')
+    log.tag_configure('stderr', foreground='#ffb0a0')
+    log.tag_configure('info', foreground='#ffffff')
+    log.grid(row=13, column=0, columnspan=3, sticky='nsew')
+    log_scrollbar = tk.Scrollbar(root, command=log.yview)
+    log_scrollbar.grid(row=13, column=3, sticky='ns')
+    log.configure(yscrollcommand=log_scrollbar.set)
 
-root.mainloop()
+    root.mainloop()